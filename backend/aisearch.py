@@ -42,11 +42,12 @@ from azure.search.documents.indexes.models import (
 )
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
-from typing import List
-from fastapi import UploadFile
+from typing import List, Tuple
 # from rich.logging import RichHandler
 
 EMBEDDINGS_DIMENSIONS = 3072
+# Seconds an upload job waits for the indexer before giving up.
+UPLOAD_INDEXING_TIMEOUT = float(os.getenv("UPLOAD_INDEXING_TIMEOUT", "1800"))
 
 def load_azd_env():
     # """Get path to current azd env file and load file using python-dotenv"""
@@ -244,21 +245,46 @@ def upload_documents(azure_credential, source_folder, indexer_name, azure_search
     except ResourceExistsError:
         logger.info("Indexer already running, not starting again")
 
-def wait_for_indexing(azure_credential, azure_search_endpoint, indexer_name):
-    """Poll the indexer status every 5 seconds until indexing is complete."""
+def wait_for_indexing(azure_credential, azure_search_endpoint, indexer_name, progress=None, timeout=None):
+    """
+    Poll the indexer status every 5 seconds until indexing is complete.
+    Blocks the calling thread; /upload runs it on the upload job pool.
+    """
     indexer_client = SearchIndexerClient(azure_search_endpoint, azure_credential)
     logger = logging.getLogger("wait_for_indexing")
     logger.setLevel(logging.INFO)
+    timeout = UPLOAD_INDEXING_TIMEOUT if timeout is None else timeout
+    deadline = time.time() + timeout
     while True:
         status_response = indexer_client.get_indexer_status(indexer_name)
         # Assuming last_result.status returns a status string like "inProgress" when still indexing.
-        current_status = getattr(status_response.last_result, "status", None)
-        if current_status is not None and current_status.lower() != "inprogress":
+        last_result = status_response.last_result
+        current_status = getattr(last_result, "status", None)
+        if progress is not None:
+            progress("indexing", indexer_status=current_status,
+                     items_processed=getattr(last_result, "item_count", None),
+                     items_failed=getattr(last_result, "failed_item_count", None))
+        # transientFailure is retried by the indexer itself, so keep waiting until the timeout
+        if current_status is not None and current_status.lower() not in ("inprogress", "transientfailure"):
             logger.info("Indexing complete with status: %s", current_status)
+            if current_status.lower() not in ("success", "reset"):
+                raise RuntimeError(f"Indexer {indexer_name} finished with status {current_status}: {getattr(last_result, 'error_message', None)}")
             break
-        logger.info("Indexing in progress, waiting 5 seconds...")
+        if time.time() > deadline:
+            raise TimeoutError(f"Indexer {indexer_name} still {current_status or 'running'} after {timeout:.0f}s")
+        logger.info("Indexing %s, waiting 5 seconds...", current_status or "in progress")
         time.sleep(5)
-def process_upload_and_index(index_name: str, upload_files: List[UploadFile]):
+
+def process_upload_and_index(index_name: str, documents: List[Tuple[str, bytes]], progress=None):
+    """
+    Upload documents as blobs, provision the index and wait for the indexer.
+
+    Args:
+        index_name: Index, indexer and blob container name
+        documents: (filename, contents) pairs
+        progress: Optional callback progress(phase, **fields) for "upload", "provisioning" and "indexing"
+    """
+    progress = progress or (lambda phase, **fields: None)
     # Store each file in the container named index_name
     logging.basicConfig(level=logging.WARNING, format="%(message)s", datefmt="[%X]")
     logger = logging.getLogger("process_upload_and_index")
@@ -289,15 +315,19 @@ def process_upload_and_index(index_name: str, upload_files: List[UploadFile]):
         logger.info(f"Created blob storage container: {azure_storage_container}")
     existing_blobs = [blob.name for blob in container_client.list_blobs()]
 
-    for file in upload_files:
-        file_contents = file.file.read()
-        filename = file.filename
+    skipped = 0
+    progress("upload", status="running", done=0, skipped=0, total=len(documents))
+    for done, (filename, file_contents) in enumerate(documents, start=1):
         if filename in existing_blobs:
             logger.info("Blob already exists, skipping file: %s", filename)
+            skipped += 1
         else:
             logger.info("Uploading blob for file: %s", filename)
             container_client.upload_blob(filename, file_contents, overwrite=True)
+        progress("upload", done=done, skipped=skipped)
+    progress("upload", status="succeeded")
 
+    progress("provisioning", status="running")
     setup_index(azure_credential,
                     azure_storage_endpoint=AZURE_STORAGE_ENDPOINT,
             index_name=f"{index_name}",
@@ -310,8 +340,11 @@ def process_upload_and_index(index_name: str, upload_files: List[UploadFile]):
             azure_openai_embedding_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
             azure_openai_embedding_model=AZURE_OPENAI_EMBEDDING_MODEL,
             azure_openai_embeddings_dimensions=EMBEDDINGS_DIMENSIONS)
-    
-    wait_for_indexing(azure_credential, AZURE_SEARCH_ENDPOINT, index_name)
+    progress("provisioning", status="succeeded")
+
+    progress("indexing", status="running")
+    wait_for_indexing(azure_credential, AZURE_SEARCH_ENDPOINT, index_name, progress=progress)
+    progress("indexing", status="succeeded")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+# File: conversation_index.py
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+PREVIEW_LENGTH = 120
+
+
+class ConversationIndex:
+    def __init__(self, path: str) -> None:
+        """
+        Sidecar metadata index for the file-based conversation store.
+
+        Keeps one row per session (timestamp, message count, first-message
+        preview) in an embedded SQLite table so sessions can be listed and
+        paginated without opening conversation bodies.
+
+        Args:
+            path: Location of the SQLite database file
+        """
+        self.path = path
+        self.created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    id TEXT,
+                    timestamp TEXT,
+                    updated_at TEXT,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    preview TEXT,
+                    PRIMARY KEY (user_id, session_id)
+                )
+            """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversations_user_timestamp ON conversations (user_id, timestamp DESC)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp DESC)"
+            )
+
+    @staticmethod
+    def make_preview(message: dict) -> Optional[str]:
+        content = message.get("content") if isinstance(message, dict) else None
+        if content is None:
+            return None
+        return str(content)[:PREVIEW_LENGTH]
+
+    def record_messages(self, user_id: str, session_id: str, id: Optional[str], timestamp: Optional[str], messages: List[dict]) -> None:
+        """Add a batch of appended messages to the session's row, creating it if needed."""
+        if not messages:
+            return
+        updated_at = messages[-1].get("time") if isinstance(messages[-1], dict) else None
+        with self._lock, self._connection:
+            self._connection.execute("""
+                INSERT INTO conversations (user_id, session_id, id, timestamp, updated_at, message_count, preview)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, session_id) DO UPDATE SET
+                    id = COALESCE(conversations.id, excluded.id),
+                    timestamp = COALESCE(conversations.timestamp, excluded.timestamp),
+                    updated_at = COALESCE(excluded.updated_at, conversations.updated_at),
+                    message_count = conversations.message_count + excluded.message_count,
+                    preview = COALESCE(conversations.preview, excluded.preview)
+            """, (user_id, session_id, id, timestamp, updated_at or timestamp, len(messages), self.make_preview(messages[0])))
+
+    def put(self, conversation: dict) -> None:
+        """Replace the session's row from a full conversation document."""
+        messages = conversation.get("messages") or []
+        updated_at = messages[-1].get("time") if messages and isinstance(messages[-1], dict) else None
+        with self._lock, self._connection:
+            self._connection.execute("""
+                INSERT OR REPLACE INTO conversations (user_id, session_id, id, timestamp, updated_at, message_count, preview)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                conversation.get("user_id"),
+                conversation.get("session_id"),
+                conversation.get("id"),
+                conversation.get("timestamp"),
+                updated_at or conversation.get("timestamp"),
+                len(messages),
+                self.make_preview(messages[0]) if messages else None,
+            ))
+
+    def remove(self, user_id: str, session_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+            )
+
+    def get(self, user_id: str, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> Dict:
+        """Page through sessions, newest first, optionally for one user."""
+        where, parameters = ("WHERE user_id = ?", [user_id]) if user_id is not None else ("", [])
+        with self._lock:
+            total_count = self._connection.execute(
+                f"SELECT COUNT(1) FROM conversations {where}", parameters
+            ).fetchone()[0]
+            total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
+            page = max(1, min(page, total_pages))
+            rows = self._connection.execute(
+                f"SELECT * FROM conversations {where} ORDER BY timestamp DESC, session_id LIMIT ? OFFSET ?",
+                parameters + [page_size, (page - 1) * page_size]
+            ).fetchall()
+        return {
+            "conversations": [dict(row) for row in rows],
+            "total_count": total_count,
+            "page": page,
+            "total_pages": total_pages
+        }
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM conversations")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
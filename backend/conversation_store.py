@@ -0,0 +1,142 @@
+# File: conversation_store.py
+import os
+from typing import List, Optional, Protocol
+
+import crud
+import sqlite_store
+from persistence import run_blocking
+
+# Which backend holds conversations: "file" (crud.py), "sqlite" (sqlite_store.py)
+# or "cosmos" (the ag_demo container).
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "cosmos")
+
+
+class ConversationStore(Protocol):
+    """Async interface every conversation backend implements."""
+
+    async def save_message(self, id, user_id: str, session_id: str, message: dict, agents, run_mode_locally, timestamp: str) -> dict: ...
+
+    async def reserve_sequence(self, user_id: str, session_id: str, messages: List[dict]) -> Optional[int]: ...
+
+    async def append_messages(self, user_id: str, session_id: str, messages: List[dict], durability: Optional[str] = None, start_seq: Optional[int] = None) -> int: ...
+
+    async def get_conversation(self, user_id: str, session_id: str, start_seq: int = 0, end_seq: Optional[int] = None) -> Optional[dict]: ...
+
+    async def list_conversations(self, user_id: Optional[str] = None, page: int = 1, page_size: int = 20, continuation_token: Optional[str] = None) -> dict: ...
+
+    async def delete_conversation(self, user_id: str, session_id: str) -> bool: ...
+
+    async def compact_conversation(self, user_id: str, session_id: str) -> Optional[dict]: ...
+
+    async def set_run_status(self, user_id: str, session_id: str, status: str) -> bool: ...
+
+
+class _ModuleConversationStore:
+    """Runs a blocking crud-style module on the bounded persistence pool."""
+    module = None
+
+    async def save_message(self, id, user_id, session_id, message, agents, run_mode_locally, timestamp):
+        return await run_blocking(
+            self.module.save_message,
+            id=id, user_id=user_id, session_id=session_id, message=message,
+            agents=agents, run_mode_locally=run_mode_locally, timestamp=timestamp
+        )
+
+    async def reserve_sequence(self, user_id, session_id, messages):
+        # Local stores number messages in the same write that stores them
+        return None
+
+    async def append_messages(self, user_id, session_id, messages, durability=None, start_seq=None):
+        return await run_blocking(self.module.append_messages, user_id, session_id, messages, durability or crud.DURABILITY_NONE)
+
+    async def get_conversation(self, user_id, session_id, start_seq=0, end_seq=None):
+        conversation = await run_blocking(self.module.get_conversation, user_id, session_id)
+        if conversation is not None and (start_seq or end_seq is not None):
+            conversation["messages"] = conversation["messages"][start_seq:end_seq]
+        return conversation
+
+    async def list_conversations(self, user_id=None, page=1, page_size=20, continuation_token=None):
+        # Local stores page by number; an OFFSET over a local index is cheap
+        return await run_blocking(self.module.list_conversations, user_id, page, page_size)
+
+    async def delete_conversation(self, user_id, session_id):
+        return await run_blocking(self.module.delete_conversation, user_id, session_id)
+
+    async def compact_conversation(self, user_id, session_id):
+        return await run_blocking(self.module.compact_conversation, user_id, session_id)
+
+    async def set_run_status(self, user_id, session_id, status):
+        return await run_blocking(self.module.set_run_status, user_id, session_id, status)
+
+
+class FileConversationStore(_ModuleConversationStore):
+    module = crud
+
+
+class SQLiteConversationStore(_ModuleConversationStore):
+    module = sqlite_store
+
+    async def get_conversation(self, user_id, session_id, start_seq=0, end_seq=None):
+        return await run_blocking(self.module.get_conversation, user_id, session_id, start_seq, end_seq)
+
+
+class CosmosConversationStore:
+    def __init__(self, db) -> None:
+        """
+        Conversation store backed by the CosmosDB ag_demo container.
+
+        Args:
+            db: The application's CosmosDB instance
+        """
+        self.db = db
+
+    async def save_message(self, id, user_id, session_id, message, agents, run_mode_locally, timestamp):
+        header = {"conversation_id": str(id) if id is not None else None, "agents": agents,
+                  "run_mode_locally": run_mode_locally, "timestamp": timestamp}
+        await run_blocking(self.db.append_conversation_messages, user_id, session_id, [message], header)
+        return {"id": session_id, "user_id": user_id, "session_id": session_id, "messages": [message],
+                "agents": agents, "run_mode_locally": run_mode_locally, "timestamp": timestamp}
+
+    async def reserve_sequence(self, user_id, session_id, messages):
+        return await run_blocking(self.db.reserve_conversation_sequence, user_id, session_id, messages)
+
+    async def append_messages(self, user_id, session_id, messages, durability=None, start_seq=None):
+        if not messages:
+            return 0
+        await run_blocking(self.db.append_conversation_messages, user_id, session_id, messages, None, start_seq)
+        return len(messages)
+
+    async def get_conversation(self, user_id, session_id, start_seq=0, end_seq=None):
+        items = await run_blocking(self.db.fetch_user_conversation, user_id, session_id, start_seq, end_seq)
+        return items[0] if items else None
+
+    async def list_conversations(self, user_id=None, page=1, page_size=20, continuation_token=None):
+        return await run_blocking(
+            self.db.fetch_user_conversatons,
+            user_id=user_id, page=page, page_size=page_size, continuation_token=continuation_token
+        )
+
+    async def delete_conversation(self, user_id, session_id):
+        result = await run_blocking(self.db.delete_user_conversation, user_id=user_id, session_id=session_id)
+        return not (isinstance(result, dict) and "error" in result)
+
+    async def compact_conversation(self, user_id, session_id):
+        # Each message is already its own document in the messages container
+        return None
+
+    async def set_run_status(self, user_id, session_id, status):
+        return await run_blocking(self.db.set_conversation_run_status, user_id, session_id, status)
+
+
+def create_conversation_store(db=None, kind: Optional[str] = None) -> ConversationStore:
+    """Build the conversation store selected by CONVERSATION_STORE."""
+    kind = (kind or CONVERSATION_STORE).lower()
+    if kind == "file":
+        return FileConversationStore()
+    if kind == "sqlite":
+        return SQLiteConversationStore()
+    if kind == "cosmos":
+        if db is None:
+            raise ValueError("CONVERSATION_STORE=cosmos requires a CosmosDB instance")
+        return CosmosConversationStore(db)
+    raise ValueError(f"Unknown CONVERSATION_STORE: {kind}")
@@ -0,0 +1,116 @@
+# File: cosmos_bulk.py
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Tuple
+
+from azure.cosmos.exceptions import CosmosBatchOperationError, CosmosHttpResponseError
+
+# Partitions written at the same time, and operations per transactional batch
+# (Cosmos allows at most 100 operations in one batch).
+BULK_MAX_CONCURRENCY = int(os.getenv("BULK_MAX_CONCURRENCY", "8"))
+BULK_BATCH_SIZE = min(int(os.getenv("BULK_BATCH_SIZE", "100")), 100)
+
+# (partition key value, batch operation) e.g. ("team-1", ("upsert", (item,)))
+BulkOperation = Tuple[Any, tuple]
+
+
+@dataclass
+class BulkReport:
+    name: str
+    operations: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    batches: int = 0
+    request_charge: float = 0.0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def operations_per_second(self) -> float:
+        return self.succeeded / self.seconds if self.seconds else 0.0
+
+    @property
+    def ru_per_operation(self) -> float:
+        return self.request_charge / self.operations if self.operations else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name}: {self.succeeded}/{self.operations} ok in {self.batches} batches, "
+                f"{self.seconds:.2f}s ({self.operations_per_second:.1f} ops/s), "
+                f"{self.request_charge:.2f} RU ({self.ru_per_operation:.2f} RU/op)")
+
+
+class BulkExecutor:
+    def __init__(self, max_concurrency: int = None, batch_size: int = None) -> None:
+        """
+        Runs many point operations against one container.
+
+        Operations are grouped by partition key and sent as transactional
+        batches (all-or-nothing within a partition); different partitions
+        run concurrently on at most max_concurrency threads.
+
+        Args:
+            max_concurrency: Partitions/batches in flight at once
+            batch_size: Operations per transactional batch (max 100)
+        """
+        self.max_concurrency = max_concurrency or BULK_MAX_CONCURRENCY
+        self.batch_size = min(batch_size or BULK_BATCH_SIZE, 100)
+        self._logger = logging.getLogger("cosmos_bulk")
+
+    def _run_batch(self, container, partition_key, operations: List[tuple]) -> Tuple[int, float, str]:
+        charges = []
+        # response_hook keeps the charge per call; last_response_headers is shared across threads
+        hook = lambda headers, _: charges.append(float(headers.get("x-ms-request-charge", 0) or 0))
+        try:
+            container.execute_item_batch(batch_operations=operations, partition_key=partition_key, response_hook=hook)
+            return len(operations), sum(charges), None
+        except CosmosBatchOperationError as e:
+            return 0, sum(charges), f"batch for partition {partition_key} failed at operation {e.error_index}: {e.message}"
+        except CosmosHttpResponseError as e:
+            return 0, sum(charges), f"batch for partition {partition_key} failed: {e.message}"
+
+    def execute(self, container, operations: Iterable[BulkOperation], name: str = "bulk") -> BulkReport:
+        by_partition = defaultdict(list)
+        for partition_key, operation in operations:
+            # Hierarchical keys arrive as lists; group on a hashable tuple
+            key = tuple(partition_key) if isinstance(partition_key, list) else partition_key
+            by_partition[key].append(operation)
+        batches = [
+            (list(key) if isinstance(key, tuple) else key, ops[start:start + self.batch_size])
+            for key, ops in by_partition.items()
+            for start in range(0, len(ops), self.batch_size)
+        ]
+        report = BulkReport(name=name, operations=sum(len(ops) for _, ops in batches), batches=len(batches))
+        started = time.perf_counter()
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches)), thread_name_prefix="cosmos-bulk") as pool:
+                futures = [pool.submit(self._run_batch, container, pk, ops) for pk, ops in batches]
+                for (_, ops), future in zip(batches, futures):
+                    succeeded, charge, error = future.result()
+                    report.succeeded += succeeded
+                    report.failed += len(ops) - succeeded
+                    report.request_charge += charge
+                    if error:
+                        report.errors.append(error)
+                        self._logger.error(error)
+        report.seconds = time.perf_counter() - started
+        self._logger.info(report.summary())
+        return report
+
+    def upsert_items(self, container, items: Iterable[dict], partition_key_field, name: str = "upsert") -> BulkReport:
+        """
+        Upsert items; safe to re-run because an existing id is simply overwritten.
+        partition_key_field is a field name, or a tuple of names for hierarchical keys.
+        """
+        if isinstance(partition_key_field, tuple):
+            key_of = lambda item: [item[f] for f in partition_key_field]
+        else:
+            key_of = lambda item: item[partition_key_field]
+        return self.execute(container, ((key_of(item), ("upsert", (item,))) for item in items), name)
+
+    def delete_items(self, container, keys: Iterable[Tuple[str, Any]], name: str = "delete") -> BulkReport:
+        """Delete items given as (id, partition key) pairs."""
+        return self.execute(container, ((partition_key, ("delete", (item_id,))) for item_id, partition_key in keys), name)
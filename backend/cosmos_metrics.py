@@ -0,0 +1,126 @@
+# File: cosmos_metrics.py
+import bisect
+import contextvars
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Queries/operations charging more than this many RU are logged with their text.
+COSMOS_SLOW_QUERY_RU = float(os.getenv("COSMOS_SLOW_QUERY_RU", "100"))
+
+RU_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+LATENCY_MS_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+ITEM_COUNT_BUCKETS = [0, 1, 5, 10, 50, 100, 500, 1000]
+
+# Route template of the request being served, e.g. "/teams/{team_id}"; set by
+# the HTTP middleware in main.py and carried onto the persistence pool.
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("current_endpoint", default="-")
+
+_logger = logging.getLogger("cosmos_metrics")
+
+
+class Histogram:
+    def __init__(self, buckets: List[float]) -> None:
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, result = 0, []
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else f"{bound:g}", total))
+        return result
+
+
+class OperationStats:
+    def __init__(self) -> None:
+        self.request_charge = Histogram(RU_BUCKETS)
+        self.server_latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.client_latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.item_count = Histogram(ITEM_COUNT_BUCKETS)
+        self.errors = 0
+
+
+class CosmosMetrics:
+    def __init__(self, slow_query_ru: Optional[float] = None) -> None:
+        """
+        Per-operation request charge, latency and item-count histograms,
+        keyed by (CosmosDB operation, calling endpoint).
+
+        Args:
+            slow_query_ru: RU above which an operation is logged with its query text
+        """
+        self.slow_query_ru = COSMOS_SLOW_QUERY_RU if slow_query_ru is None else slow_query_ru
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], OperationStats] = {}
+
+    def record(
+        self,
+        operation: str,
+        request_charge: float,
+        client_latency_ms: float,
+        server_latency_ms: float = 0.0,
+        item_count: int = 1,
+        error: bool = False,
+        query: Optional[str] = None,
+        parameters: Optional[list] = None,
+    ) -> None:
+        endpoint = current_endpoint.get()
+        with self._lock:
+            stats = self._stats.get((operation, endpoint))
+            if stats is None:
+                stats = self._stats[(operation, endpoint)] = OperationStats()
+            stats.request_charge.observe(request_charge)
+            stats.client_latency_ms.observe(client_latency_ms)
+            stats.server_latency_ms.observe(server_latency_ms)
+            stats.item_count.observe(item_count)
+            if error:
+                stats.errors += 1
+        if request_charge > self.slow_query_ru:
+            _logger.warning(
+                f"Expensive Cosmos operation {operation} from {endpoint}: {request_charge:.2f} RU, "
+                f"{item_count} items, {client_latency_ms:.1f}ms"
+                + (f", query: {query} parameters: {parameters}" if query else "")
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def render_prometheus(self) -> str:
+        """Histograms in the Prometheus text exposition format."""
+        families = [
+            ("cosmos_request_charge", "request_charge", "Request units charged per operation"),
+            ("cosmos_server_latency_ms", "server_latency_ms", "Server-side duration reported by Cosmos"),
+            ("cosmos_client_latency_ms", "client_latency_ms", "Wall-clock duration seen by the backend"),
+            ("cosmos_item_count", "item_count", "Items returned or written per operation"),
+        ]
+        with self._lock:
+            snapshot = sorted(self._stats.items())
+            lines = []
+            for name, attribute, description in families:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (operation, endpoint), stats in snapshot:
+                    histogram = getattr(stats, attribute)
+                    labels = f'operation="{operation}",endpoint="{endpoint}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:g}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+            lines.append("# HELP cosmos_errors_total Operations that raised")
+            lines.append("# TYPE cosmos_errors_total counter")
+            for (operation, endpoint), stats in snapshot:
+                lines.append(f'cosmos_errors_total{{operation="{operation}",endpoint="{endpoint}"}} {stats.errors}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = CosmosMetrics()
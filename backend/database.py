@@ -1,5 +1,9 @@
 import os
+import logging
+import threading
 from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError
+from azure.core import MatchConditions
 from azure.identity import DefaultAzureCredential
 from typing import Optional, List, Dict
 
@@ -7,42 +11,312 @@ from autogen_agentchat.base import TaskResult
 from autogen_agentchat.messages import MultiModalMessage, TextMessage, ToolCallExecutionEvent, ToolCallRequestEvent, SelectSpeakerEvent, ToolCallSummaryMessage
 
 from schemas import AutoGenMessage
+from artifact_store import externalize_data_uri
+from cosmos_bulk import BulkExecutor
+from cosmos_metrics import metrics
 import uuid
 from dotenv import load_dotenv
 import time
 import glob
 import json
+import base64
+from datetime import datetime, timezone
+
+# Operations accepted by Cosmos partial document update, and its per-request limit
+PATCH_OPERATIONS = ("add", "set", "replace", "remove", "incr", "move")
+MAX_PATCH_OPERATIONS = 10
+
+# Container holding one document per conversation message (partition key /session_id)
+MESSAGES_CONTAINER = os.getenv("COSMOS_DB_MESSAGES_CONTAINER", "ag_demo_messages")
+
+# Conversation headers container. With COSMOS_DB_HIERARCHICAL_PK=true it is
+# partitioned on (user_id, session_id) so one busy account (demo/service users)
+# is spread across physical partitions instead of one 20 GB logical partition.
+# Existing containers can't change their key: copy them with
+# "python database.py migrate-partitioning --target <new container>" and point
+# COSMOS_DB_CONVERSATIONS_CONTAINER at the copy.
+CONVERSATIONS_CONTAINER = os.getenv("COSMOS_DB_CONVERSATIONS_CONTAINER", "ag_demo")
+HIERARCHICAL_PK = os.getenv("COSMOS_DB_HIERARCHICAL_PK", "false").lower() == "true"
+CONVERSATION_PK_PATHS = ["/user_id", "/session_id"]
+
+# Indexing policies applied when containers are created and by reconcile_indexing_policies().
+# Message bodies, base64 images, agent definitions and plans are never filtered
+# on, so excluding them keeps write RU flat as conversations and teams grow.
+INDEXING_POLICIES = {
+    CONVERSATIONS_CONTAINER: {
+        "indexingMode": "consistent",
+        "automatic": True,
+        "includedPaths": [{"path": "/*"}],
+        "excludedPaths": [{"path": "/messages/*"}, {"path": "/agents/*"}, {"path": "/\"_etag\"/?"}],
+        # History listing: one user's conversations, newest first
+        "compositeIndexes": [
+            [{"path": "/user_id", "order": "ascending"}, {"path": "/timestamp", "order": "descending"}],
+            [{"path": "/user_id", "order": "ascending"}, {"path": "/timestamp_epoch", "order": "descending"}],
+        ],
+    },
+    "agent_teams": {
+        "indexingMode": "consistent",
+        "automatic": True,
+        "includedPaths": [{"path": "/*"}],
+        "excludedPaths": [
+            {"path": "/agents/*"}, {"path": "/plan/?"}, {"path": "/starting_tasks/*"},
+            {"path": "/logo/?"}, {"path": "/\"_etag\"/?"},
+        ],
+    },
+    MESSAGES_CONTAINER: {
+        "indexingMode": "consistent",
+        "automatic": True,
+        # Only what range reads and deletes filter on; the message itself is opaque
+        "includedPaths": [{"path": "/session_id/?"}, {"path": "/user_id/?"}, {"path": "/seq/?"}],
+        "excludedPaths": [{"path": "/*"}],
+    },
+}
+
+CONTAINER_PARTITION_KEYS = {
+    CONVERSATIONS_CONTAINER: CONVERSATION_PK_PATHS if HIERARCHICAL_PK else "/user_id",
+    "agent_teams": "/team_id",
+    # One document per streamed message, partitioned by session so a
+    # conversation's messages are a single-partition range read by seq
+    MESSAGES_CONTAINER: "/session_id",
+}
+
+
+def partition_key_definition(paths) -> PartitionKey:
+    """A list of paths becomes a hierarchical (MultiHash) key."""
+    if isinstance(paths, list):
+        return PartitionKey(path=paths, kind="MultiHash")
+    return PartitionKey(path=paths)
+
+
+def _indexing_signature(policy: dict) -> tuple:
+    """The parts of an indexing policy we manage, normalized for comparison."""
+    def paths(key):
+        return frozenset(p["path"] for p in policy.get(key, []) if p["path"] != '/"_etag"/?')
+    composites = frozenset(
+        tuple((c["path"], c.get("order", "ascending").lower()) for c in composite)
+        for composite in policy.get("compositeIndexes", [])
+    )
+    return (policy.get("indexingMode", "consistent").lower(), paths("includedPaths"), paths("excludedPaths"), composites)
+
+
+# "lazy": startup builds nothing that talks to Cosmos; the database and
+# containers must already exist (python database.py provision).
+# "startup": create the database and containers when CosmosDB() is built.
+COSMOS_DB_PROVISION = os.getenv("COSMOS_DB_PROVISION", "lazy")
+
+# Seconds an approximate per-user conversation count is reused before it is recounted
+CONVERSATION_COUNT_TTL = float(os.getenv("CONVERSATION_COUNT_TTL", "300"))
+
+
+def to_epoch(timestamp: Optional[str]) -> float:
+    """Numeric form of a conversation timestamp, so range filters and ORDER BY can use the index."""
+    if not timestamp:
+        return time.time()
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return time.time()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def encode_continuation_token(timestamp_epoch: float, seen_ids: List[str]) -> str:
+    payload = json.dumps({"ts": timestamp_epoch, "ids": seen_ids}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_continuation_token(token: str) -> dict:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return {"ts": float(payload["ts"]), "ids": [str(i) for i in payload.get("ids", [])]}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid continuation token: {str(e)}")
 
 class CosmosDB:
-    def __init__(self):
+    def __init__(self, provision: Optional[bool] = None):
         load_dotenv("./.env", override=True)
         # Get Cosmos DB account details
-        COSMOS_DB_URI = os.getenv("COSMOS_DB_URI", "https://YOURDB.documents.azure.com:443/")
-        COSMOS_DB_DATABASE = os.getenv("COSMOS_DB_DATABASE", "ag_demo")
-        credential = DefaultAzureCredential()
-        self.client = CosmosClient(COSMOS_DB_URI, credential=credential)
-        self.database = self.client.create_database_if_not_exists(id=COSMOS_DB_DATABASE)
+        self.uri = os.getenv("COSMOS_DB_URI", "https://YOURDB.documents.azure.com:443/")
+        self.database_name = os.getenv("COSMOS_DB_DATABASE", "ag_demo")
+        # The client, database and container proxies are built on first use;
+        # constructing CosmosClient already reads the account over the network
+        self._client = None
+        self._database = None
+        self._client_lock = threading.Lock()
         self.containers = {}
-        # Pre-initialize default containers
-        self.containers["ag_demo"] = self.database.create_container_if_not_exists(
-            id="ag_demo",
-            partition_key=PartitionKey(path="/user_id"),
-            offer_throughput=400
-        )
-        self.containers["agent_teams"] = self.database.create_container_if_not_exists(
-            id="agent_teams",
-            partition_key=PartitionKey(path="/team_id"),
-            offer_throughput=400
-        )
+        # Per thread: calls run concurrently on the persistence pool
+        self._local = threading.local()
+        self.logger = logging.getLogger("cosmosdb")
+        # user_id (None for all users) -> (expires_at, approximate conversation count)
+        self._count_cache: Dict[Optional[str], tuple] = {}
+        self.bulk = BulkExecutor()
+        if provision is None:
+            provision = COSMOS_DB_PROVISION == "startup"
+        if provision:
+            self.provision()
+
+    @property
+    def last_request_charge(self) -> float:
+        """Request units charged by this thread's most recent call, for checking query costs."""
+        return getattr(self._local, "request_charge", 0.0)
+
+    @staticmethod
+    def _header_float(headers: dict, name: str) -> float:
+        return float(headers.get(name, 0) or 0)
+
+    def _record(self, operation: str, charge: float, client_ms: float, server_ms: float = 0.0,
+                item_count: int = 1, error: bool = False, query: Optional[str] = None, parameters=None) -> float:
+        self._local.request_charge = charge
+        self.logger.info(f"{operation}: {charge} RU, {client_ms:.1f}ms")
+        metrics.record(operation, charge, client_ms, server_ms, item_count, error, query, parameters)
+        return charge
+
+    def _call(self, container, operation: str, method: str, **kwargs):
+        """Run one point operation (read_item, patch_item, ...) and record its RU and latency."""
+        headers = {}
+        # response_hook gives this call's headers; last_response_headers is shared across threads
+        kwargs["response_hook"] = lambda response_headers, _: headers.update(response_headers)
+        started = time.perf_counter()
+        error = False
+        try:
+            return getattr(container, method)(**kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(
+                operation,
+                self._header_float(headers, "x-ms-request-charge"),
+                (time.perf_counter() - started) * 1000,
+                self._header_float(headers, "x-ms-request-duration-ms"),
+                0 if error else 1,
+                error,
+            )
+
+    def _record_bulk(self, operation: str, report) -> None:
+        self._record(operation, report.request_charge, report.seconds * 1000,
+                     item_count=report.operations, error=bool(report.failed))
+
+    def _query_pages(self, container, **kwargs):
+        """Yield (items, request charge, server ms) for each page of container.query_items(**kwargs)."""
+        page_headers = []
+        paging = False
+
+        def add_page(headers, _):
+            # The SDK also calls the hook once while building the pager, with the client's
+            # shared last_response_headers (often another thread's request); skip that call
+            if paging:
+                page_headers.append(headers)
+
+        pages = container.query_items(response_hook=add_page, **kwargs)
+        paging = True
+        for page in pages.by_page():
+            items = list(page)
+            charge = sum(self._header_float(headers, "x-ms-request-charge") for headers in page_headers)
+            server_ms = sum(self._header_float(headers, "x-ms-request-duration-ms") for headers in page_headers)
+            page_headers.clear()
+            yield items, charge, server_ms
+
+    def _query(self, container, operation: str, query: str, parameters: Optional[List[dict]] = None, partition_key=None) -> List[dict]:
+        """Run a query, scoped to one logical partition when partition_key is given, and record its total RU."""
+        if partition_key is not None:
+            scope = {"partition_key": partition_key}
+        else:
+            scope = {"enable_cross_partition_query": True}
+        items, charge, server_ms = [], 0.0, 0.0
+        started = time.perf_counter()
+        error = False
+        try:
+            for page, page_charge, page_server_ms in self._query_pages(container, query=query, parameters=parameters or [], **scope):
+                items.extend(page)
+                charge += page_charge
+                server_ms += page_server_ms
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(operation, charge, (time.perf_counter() - started) * 1000, server_ms,
+                         len(items), error, query, parameters)
+        return items
     
-    def get_container(self, container_name: str = "ag_demo"):
+    @property
+    def client(self) -> CosmosClient:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = CosmosClient(self.uri, credential=DefaultAzureCredential())
+        return self._client
+
+    @property
+    def database(self):
+        if self._database is None:
+            self._database = self.client.get_database_client(self.database_name)
+        return self._database
+
+    def warm_up(self) -> None:
+        """Build the client (one account read) so the first request doesn't pay for it."""
+        started = time.perf_counter()
+        self.client
+        self.logger.info(f"Cosmos client ready in {time.perf_counter() - started:.2f}s")
+
+    def provision(self) -> None:
+        """Create the database and containers if missing. Admin step; not needed on every start."""
+        self._database = self.client.create_database_if_not_exists(id=self.database_name)
+        for container_name, partition_key_path in CONTAINER_PARTITION_KEYS.items():
+            self.containers[container_name] = self._database.create_container_if_not_exists(
+                id=container_name,
+                partition_key=partition_key_definition(partition_key_path),
+                indexing_policy=INDEXING_POLICIES[container_name],
+                offer_throughput=400
+            )
+            print(f"Container {container_name} ready")
+
+    def reconcile_indexing_policies(self, dry_run: bool = False) -> List[str]:
+        """
+        Bring existing containers' indexing policies in line with INDEXING_POLICIES.
+
+        create_container_if_not_exists leaves existing containers alone, so
+        containers created before a policy change keep indexing everything
+        until this runs. Cosmos re-indexes in the background after an update.
+        Returns the names of the containers that were (or would be) updated.
+        """
+        changed = []
+        for container_name, policy in INDEXING_POLICIES.items():
+            container = self.get_container(container_name)
+            current = self._call(container, "read_container", "read").get("indexingPolicy", {})
+            if _indexing_signature(current) == _indexing_signature(policy):
+                print(f"{container_name}: indexing policy up to date")
+                continue
+            changed.append(container_name)
+            if dry_run:
+                print(f"{container_name}: indexing policy differs (dry run, not updated)")
+                continue
+            self.containers[container_name] = self.database.replace_container(
+                container,
+                partition_key=partition_key_definition(CONTAINER_PARTITION_KEYS[container_name]),
+                indexing_policy=policy
+            )
+            print(f"{container_name}: indexing policy updated, re-indexing in the background")
+        return changed
+
+    def conversation_partition_key(self, user_id: Optional[str], session_id: Optional[str] = None):
+        """
+        Partition key value for the conversations container. Without a
+        session_id under hierarchical partitioning this is the [user_id]
+        prefix, which still targets only that user's partitions.
+        """
+        if user_id is None:
+            return None
+        if not HIERARCHICAL_PK:
+            return user_id
+        return [user_id, session_id] if session_id is not None else [user_id]
+
+    def get_container(self, container_name: str = CONVERSATIONS_CONTAINER):
         if container_name in self.containers:
             return self.containers[container_name]
-        container = self.database.create_container_if_not_exists(
-            id=container_name,
-            partition_key=PartitionKey(path="/user_id"),
-            offer_throughput=400
-        )
+        # A proxy only; no round trip until it is used
+        container = self.database.get_container_client(container_name)
         self.containers[container_name] = container
         return container
     
@@ -111,6 +385,7 @@ class CosmosDB:
             _response.type = "N/A"
             _response.source = "N/A"
             _response.content = "Agents mumbling."
+        _response.content_image = externalize_data_uri(_response.content_image)
         return _response
 
     def store_conversation(self, conversation: TaskResult, conversation_details: AutoGenMessage, conversation_dict: dict):
@@ -118,108 +393,297 @@ class CosmosDB:
         for message in conversation.messages:
             _m = self.format_message(message)
             _messsages.append(_m.to_json())
+        header = {"agents": conversation_dict["agents"], "run_mode_locally": False, "timestamp": conversation_details.time}
+        return self.append_conversation_messages(conversation_details.session_user, conversation_details.session_id, _messsages, header)
+
+    def _create_conversation_header(self, user_id: str, session_id: str, header: Optional[dict], first_message: dict) -> None:
+        header = header or {}
+        timestamp = header.get("timestamp") or first_message.get("time")
         conversation_document_item = {
-            "id": str(uuid.uuid4()),
-            "user_id": conversation_details.session_user,
-            "session_id": conversation_details.session_id,
-            "messages": _messsages, 
-            "agents": conversation_dict["agents"],
-            "run_mode_locally": False,
-            "timestamp": conversation_details.time,
+            "id": session_id,
+            "conversation_id": header.get("conversation_id"),
+            "user_id": user_id,
+            "session_id": session_id,
+            "agents": header.get("agents"),
+            "run_mode_locally": header.get("run_mode_locally", False),
+            "timestamp": timestamp,
+            "timestamp_epoch": to_epoch(timestamp),
+            "message_count": 0,
         }
-        container = self.get_container("ag_demo")
-        response = container.create_item(body=conversation_document_item)
-        return response
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        try:
+            self._call(container, "create_conversation_header", "create_item", body=conversation_document_item)
+            self._adjust_cached_count(user_id, 1)
+        except CosmosResourceExistsError:
+            # Another writer created it first
+            pass
 
-    def fetch_user_conversatons(self, user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> Dict:
-        container = self.get_container("ag_demo")
-        
-        # First, get the total count
-        if user_id is None:
-            count_query = "SELECT VALUE COUNT(1) FROM c"
-            count_parameters = []
-        else:
-            count_query = "SELECT VALUE COUNT(1) FROM c WHERE c.user_id = @userId"
-            count_parameters = [{"name": "@userId", "value": user_id}]
-            
-        count_results = list(container.query_items(
-            query=count_query, 
-            parameters=count_parameters, 
-            enable_cross_partition_query=True
-        ))
-        total_count = count_results[0] if count_results else 0
-        
-        # Calculate total pages
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
-        
-        # Ensure page is within valid range
-        page = max(1, min(page, total_pages))
-        
-        # Calculate skip for pagination
-        skip = (page - 1) * page_size
-        
-        # Get paginated results
-        if user_id is None:
-            query = "SELECT c.user_id, c.session_id, c.timestamp FROM c ORDER BY c.timestamp DESC OFFSET @skip LIMIT @limit"
-            parameters = [
-                {"name": "@skip", "value": skip},
-                {"name": "@limit", "value": page_size}
-            ]
-        else:
-            query = "SELECT c.user_id, c.session_id, c.timestamp FROM c WHERE c.user_id = @userId ORDER BY c.timestamp DESC OFFSET @skip LIMIT @limit"
-            parameters = [
-                {"name": "@userId", "value": user_id},
-                {"name": "@skip", "value": skip},
-                {"name": "@limit", "value": page_size}
-            ]
-            
-        items = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
-        
-        return {
+    def _reserve_sequence(self, user_id: str, session_id: str, count: int, header: Optional[dict], first_message: dict) -> int:
+        """Atomically bump the header's message_count and return the first reserved seq."""
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        operations = [{"op": "incr", "path": "/message_count", "value": count}]
+        try:
+            updated = self._call(container, "reserve_sequence", "patch_item",
+                                 item=session_id, partition_key=self.conversation_partition_key(user_id, session_id),
+                                 patch_operations=operations)
+        except CosmosResourceNotFoundError:
+            self._create_conversation_header(user_id, session_id, header, first_message)
+            updated = self._call(container, "reserve_sequence", "patch_item",
+                                 item=session_id, partition_key=self.conversation_partition_key(user_id, session_id),
+                                 patch_operations=operations)
+        return updated["message_count"] - count
+
+    def reserve_conversation_sequence(self, user_id: str, session_id: str, messages: List[dict], header: Optional[dict] = None) -> Optional[int]:
+        """Reserve seq numbers for messages on the conversation header and return the first one."""
+        if not messages:
+            return None
+        return self._reserve_sequence(user_id, session_id, len(messages), header, messages[0])
+
+    def append_conversation_messages(self, user_id: str, session_id: str, messages: List[dict], header: Optional[dict] = None,
+                                     start_seq: Optional[int] = None):
+        """
+        Persist messages as they stream: reserve seq numbers on the conversation
+        header (id = session_id) and upsert one document per message.
+        Pass the start_seq of an earlier reservation to retry a failed batch
+        at the same seqs. Returns the first seq written.
+        """
+        if not messages:
+            return None
+        first_seq = start_seq if start_seq is not None else self.reserve_conversation_sequence(user_id, session_id, messages, header)
+        container = self.get_container(MESSAGES_CONTAINER)
+        for offset, message in enumerate(messages):
+            seq = first_seq + offset
+            # Deterministic id, so retrying a batch with its start_seq overwrites instead of duplicating
+            self._call(container, "append_conversation_messages", "upsert_item", body={
+                "id": f"{session_id}:{seq:08d}",
+                "session_id": session_id,
+                "user_id": user_id,
+                "seq": seq,
+                "message": message,
+            })
+        return first_seq
+
+    def set_conversation_run_status(self, user_id: str, session_id: str, status: str) -> bool:
+        """Record the session's run status ("running", "finished", ...) on its conversation header."""
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        try:
+            self._call(container, "set_conversation_run_status", "patch_item",
+                       item=session_id, partition_key=self.conversation_partition_key(user_id, session_id),
+                       patch_operations=[{"op": "set", "path": "/run_status", "value": status}])
+        except CosmosResourceNotFoundError:
+            return False
+        return True
+
+    def fetch_conversation_messages(self, session_id: str, start_seq: int = 0, end_seq: Optional[int] = None) -> List[dict]:
+        """Messages [start_seq, end_seq) of a session, in order, from one partition."""
+        container = self.get_container(MESSAGES_CONTAINER)
+        conditions = ["c.seq >= @start"]
+        parameters = [{"name": "@start", "value": start_seq}]
+        if end_seq is not None:
+            conditions.append("c.seq < @end")
+            parameters.append({"name": "@end", "value": end_seq})
+        query = f"SELECT c.seq, c.message FROM c WHERE {' AND '.join(conditions)} ORDER BY c.seq"
+        items = self._query(container, "fetch_conversation_messages", query, parameters, partition_key=session_id)
+        return [item["message"] for item in items]
+
+    def _delete_conversation_messages(self, session_ids: List[str]) -> int:
+        container = self.get_container(MESSAGES_CONTAINER)
+        keys = []
+        for session_id in session_ids:
+            # Key-only lookup: just ids, no message bodies
+            items = self._query(container, "delete_conversation_messages.lookup", "SELECT VALUE c.id FROM c", partition_key=session_id)
+            keys.extend((item_id, session_id) for item_id in items)
+        report = self.bulk.delete_items(container, keys, name="delete_conversation_messages")
+        self._record_bulk("delete_conversation_messages", report)
+        return report.succeeded
+
+    def _adjust_cached_count(self, user_id: Optional[str], delta: int) -> None:
+        for key in (user_id, None):
+            cached = self._count_cache.get(key)
+            if cached is not None:
+                self._count_cache[key] = (cached[0], max(0, cached[1] + delta))
+
+    def count_user_conversations(self, user_id: Optional[str] = None) -> int:
+        """Approximate conversation count, recounted at most every CONVERSATION_COUNT_TTL seconds."""
+        cached = self._count_cache.get(user_id)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        results = self._query(container, "count_user_conversations", "SELECT VALUE COUNT(1) FROM c",
+                              partition_key=self.conversation_partition_key(user_id))
+        total_count = results[0] if results else 0
+        self._count_cache[user_id] = (time.time() + CONVERSATION_COUNT_TTL, total_count)
+        return total_count
+
+    def fetch_user_conversatons(
+        self,
+        user_id: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20,
+        continuation_token: Optional[str] = None,
+        include_total: bool = True,
+    ) -> Dict:
+        """
+        Fetch one page of conversation summaries, newest first.
+
+        Pages are keyed on timestamp_epoch rather than OFFSET, so every page
+        costs the same RU as the first. Pass the returned continuation_token
+        to get the next page; page is only echoed back for display.
+
+        Args:
+            user_id: Restrict to one user's partition (None scans all users)
+            page: Page number the caller is showing
+            page_size: Conversations per page
+            continuation_token: Opaque cursor returned with the previous page
+            include_total: Also return an approximate, cached total_count
+        """
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        conditions, parameters = [], [{"name": "@limit", "value": page_size + 1}]
+        cursor = decode_continuation_token(continuation_token) if continuation_token else None
+        if cursor is not None:
+            # Strictly older, or the same instant but not returned yet
+            conditions.append("(c.timestamp_epoch < @ts OR (c.timestamp_epoch = @ts AND NOT ARRAY_CONTAINS(@seen, c.id)))")
+            parameters += [{"name": "@ts", "value": cursor["ts"]}, {"name": "@seen", "value": cursor["ids"]}]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT TOP @limit c.id, c.user_id, c.session_id, c.timestamp, c.timestamp_epoch, c.message_count FROM c {where} ORDER BY c.timestamp_epoch DESC"
+        items = self._query(container, "fetch_user_conversatons", query, parameters,
+                            partition_key=self.conversation_partition_key(user_id))
+
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        next_token = None
+        if has_more and items:
+            last_epoch = items[-1].get("timestamp_epoch")
+            seen = [i["id"] for i in items if i.get("timestamp_epoch") == last_epoch]
+            if cursor is not None and cursor["ts"] == last_epoch:
+                seen = cursor["ids"] + seen
+            next_token = encode_continuation_token(last_epoch, seen)
+
+        result = {
             "conversations": items,
-            "total_count": total_count,
-            "page": page,
-            "total_pages": total_pages
+            "continuation_token": next_token,
+            "has_more": has_more,
+            "page": max(1, page),
         }
+        if include_total:
+            total_count = self.count_user_conversations(user_id)
+            result["total_count"] = total_count
+            result["total_pages"] = max(1, (total_count + page_size - 1) // page_size, result["page"] + (1 if has_more else 0))
+        return result
+
+    def backfill_timestamp_epoch(self) -> int:
+        """Add timestamp_epoch to conversations written before cursor pagination."""
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        query = "SELECT c.id, c.user_id, c.session_id, c.timestamp FROM c WHERE NOT IS_DEFINED(c.timestamp_epoch)"
+        updated = 0
+        for item in self._query(container, "backfill_timestamp_epoch", query):
+            self._call(
+                container, "backfill_timestamp_epoch", "patch_item",
+                item=item["id"], partition_key=self.conversation_partition_key(item["user_id"], item.get("session_id")),
+                patch_operations=[{"op": "add", "path": "/timestamp_epoch", "value": to_epoch(item.get("timestamp"))}]
+            )
+            updated += 1
+        print(f"Added timestamp_epoch to {updated} conversations.")
+        return updated
 
-    def fetch_user_conversation(self, user_id: str, session_id: str):
-        container = self.get_container("ag_demo")
-        query = "SELECT * FROM c WHERE c.user_id = @userId AND c.session_id = @sessionId"
-        parameters = [
-            {"name": "@userId", "value": user_id},
-            {"name": "@sessionId", "value": session_id},
-        ]
-        items = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+    def fetch_user_conversation(self, user_id: str, session_id: str, start_seq: int = 0, end_seq: Optional[int] = None):
+        if not user_id or not session_id:
+            return []
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        # Conversations written by append_conversation_messages use the session id as document id
+        try:
+            item = self._call(container, "fetch_user_conversation.read", "read_item",
+                              item=session_id, partition_key=self.conversation_partition_key(user_id, session_id))
+            if "messages" in item:
+                # Written before messages moved to their own container
+                item["messages"] = item["messages"][start_seq:end_seq]
+            else:
+                item["messages"] = self.fetch_conversation_messages(session_id, start_seq, end_seq)
+            return [item]
+        except CosmosResourceNotFoundError:
+            pass
+        query = "SELECT * FROM c WHERE c.session_id = @sessionId"
+        parameters = [{"name": "@sessionId", "value": session_id}]
+        items = self._query(container, "fetch_user_conversation", query, parameters,
+                            partition_key=self.conversation_partition_key(user_id, session_id))
+        for item in items:
+            item["messages"] = item.get("messages", [])[start_seq:end_seq]
         return items
 
     def delete_user_conversation(self, user_id: str, session_id: str):
-        container = self.get_container("ag_demo")
-        query = "SELECT * FROM c WHERE c.user_id = @userId AND c.session_id = @sessionId"
-        parameters = [
-            {"name": "@userId", "value": user_id},
-            {"name": "@sessionId", "value": session_id},
-        ]
-        items = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        partition_key = self.conversation_partition_key(user_id, session_id)
+        try:
+            response = self._call(container, "delete_user_conversation", "delete_item", item=session_id, partition_key=partition_key)
+            self._adjust_cached_count(user_id, -1)
+            self._delete_conversation_messages([session_id])
+            return response
+        except CosmosResourceNotFoundError:
+            pass
+        query = "SELECT c.id FROM c WHERE c.session_id = @sessionId"
+        parameters = [{"name": "@sessionId", "value": session_id}]
+        items = self._query(container, "delete_user_conversation.lookup", query, parameters, partition_key=partition_key)
         if not items:
             return {"error": f"No conversation found with user_id {user_id} and session_id {session_id}."}
-        conversation = items[0]
-        response = container.delete_item(item=conversation["id"], partition_key=conversation["user_id"])
+        response = self._call(container, "delete_user_conversation", "delete_item", item=items[0]["id"], partition_key=partition_key)
+        self._adjust_cached_count(user_id, -1)
         return response
 
     def delete_user_all_conversations(self, user_id: str):
-        container = self.get_container("ag_demo")
-        query = "SELECT * FROM c WHERE c.user_id = @userId"
-        parameters = [{"name": "@userId", "value": user_id}]
-        items = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+        container = self.get_container(CONVERSATIONS_CONTAINER)
+        items = self._query(container, "delete_user_all_conversations.lookup", "SELECT c.id, c.session_id FROM c",
+                            partition_key=self.conversation_partition_key(user_id))
         if not items:
             return {"error": f"No conversation found with user_id {user_id}."}
-        for item in items:
-            container.delete_item(item=item["id"], partition_key=item["user_id"])
+        self._delete_conversation_messages([item["session_id"] for item in items if item.get("session_id")])
+        keys = [(item["id"], self.conversation_partition_key(user_id, item.get("session_id"))) for item in items]
+        report = self.bulk.delete_items(container, keys, name="delete_user_all_conversations")
+        self._record_bulk("delete_user_all_conversations", report)
+        print(report.summary())
+        self._count_cache.clear()
+        if report.failed:
+            return {"error": f"Deleted {report.succeeded} of {report.operations} conversations for user_id {user_id}: {'; '.join(report.errors)}"}
         return True
 
-    def create_team(self, team: dict):
-        container = self.get_container("agent_teams")
-        team_document = {
+    def migrate_partitioning(self, source: str = "ag_demo", target: str = CONVERSATIONS_CONTAINER, page_size: int = 500) -> int:
+        """
+        Copy every conversation header from source into target, a container
+        partitioned on (user_id, session_id). Creates target if missing and
+        upserts, so it can be re-run after an interruption. Message documents
+        live in the messages container and do not move.
+        """
+        if source == target:
+            raise ValueError("Source and target containers must differ")
+        target_container = self.database.create_container_if_not_exists(
+            id=target,
+            partition_key=partition_key_definition(CONVERSATION_PK_PATHS),
+            indexing_policy=INDEXING_POLICIES[CONVERSATIONS_CONTAINER],
+            offer_throughput=400
+        )
+        source_container = self.database.get_container_client(source)
+        copied, skipped = 0, 0
+        started = time.perf_counter()
+        for items, charge, server_ms in self._query_pages(source_container, query="SELECT * FROM c",
+                                                          enable_cross_partition_query=True, max_item_count=page_size):
+            self._record("migrate_partitioning.read", charge, (time.perf_counter() - started) * 1000, server_ms, item_count=len(items))
+            documents = []
+            for item in items:
+                if not item.get("user_id") or not item.get("session_id"):
+                    skipped += 1
+                    print(f"Skipping {item.get('id')}: missing user_id or session_id")
+                    continue
+                documents.append({k: v for k, v in item.items() if not k.startswith("_")})
+            report = self.bulk.upsert_items(target_container, documents, ("user_id", "session_id"), name="migrate_partitioning")
+            self._record_bulk("migrate_partitioning.write", report)
+            copied += report.succeeded
+            print(report.summary())
+            started = time.perf_counter()
+        print(f"Copied {copied} conversations from {source} to {target} ({skipped} skipped). "
+              f"Set COSMOS_DB_CONVERSATIONS_CONTAINER={target} and COSMOS_DB_HIERARCHICAL_PK=true to switch.")
+        return copied
+
+    def _team_document(self, team: dict) -> dict:
+        return {
             "id": team["id"],
             "team_id": team["team_id"],
             "name": team["name"],
@@ -229,20 +693,24 @@ class CosmosDB:
             "plan": team["plan"],
             "starting_tasks": team["starting_tasks"],
         }
-        response = container.create_item(body=team_document)
+
+    def create_team(self, team: dict):
+        container = self.get_container("agent_teams")
+        team_document = self._team_document(team)
+        response = self._call(container, "create_team", "create_item", body=team_document)
         return response
 
     def get_teams(self):
         container = self.get_container("agent_teams")
         query = "SELECT * FROM c"
-        items = list(container.query_items(query=query, enable_cross_partition_query=True))
-        return items
+        return self._query(container, "get_teams", query)
 
     def get_team(self, team_id: str):
         container = self.get_container("agent_teams")
+        # team_id is the partition key, so this stays within one partition
         query = "SELECT * FROM c WHERE c.team_id = @teamId"
         parameters = [{"name": "@teamId", "value": team_id}]
-        items = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+        items = self._query(container, "get_team", query, parameters, partition_key=team_id)
         return items[0] if items else None
 
     def update_team(self, team_id: str, team: dict):
@@ -251,7 +719,64 @@ class CosmosDB:
         if not existing_team:
             return {"error": "Team not found"}
         updated_team = {**existing_team, **team}
-        response = container.replace_item(item=existing_team["id"], body=updated_team)
+        response = self._call(container, "update_team", "replace_item", item=existing_team["id"], body=updated_team)
+        return response
+
+    def _team_item_id(self, team_id: str) -> Optional[str]:
+        # Key-only lookup of the document id within the team's partition
+        container = self.get_container("agent_teams")
+        query = "SELECT VALUE c.id FROM c WHERE c.team_id = @teamId"
+        parameters = [{"name": "@teamId", "value": team_id}]
+        items = self._query(container, "team_item_id", query, parameters, partition_key=team_id)
+        return items[0] if items else None
+
+    def patch_team(self, team_id: str, operations, if_match: Optional[str] = None, item_id: Optional[str] = None):
+        """
+        Partially update a team with Cosmos patch operations.
+
+        operations is a list of {"op", "path", "value"} (op one of
+        PATCH_OPERATIONS, "from" for move) or a dict of top-level fields to
+        set; anything else raises ValueError. With if_match the patch only applies if the document's _etag is
+        unchanged; otherwise CosmosAccessConditionFailedError is raised.
+        """
+        if isinstance(operations, dict):
+            operations = [{"op": "set", "path": f"/{name}", "value": value} for name, value in operations.items()]
+        if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+            raise ValueError("Patch body must be a list of {op, path[, value|from]} operations or a dict of fields")
+        if not operations:
+            raise ValueError("No patch operations given")
+        if len(operations) > MAX_PATCH_OPERATIONS:
+            raise ValueError(f"At most {MAX_PATCH_OPERATIONS} patch operations are applied atomically, got {len(operations)}")
+        for operation in operations:
+            op = operation.get("op")
+            if op not in PATCH_OPERATIONS:
+                raise ValueError(f"Unsupported patch operation: {op}")
+            unknown = set(operation) - {"op", "path", "value", "from"}
+            if unknown:
+                raise ValueError(f"Unknown patch operation fields: {', '.join(sorted(unknown))}")
+            if op == "move" and "from" not in operation:
+                raise ValueError("move needs a 'from' path")
+            if op not in ("remove", "move") and "value" not in operation:
+                raise ValueError(f"{op} needs a 'value'")
+            # move takes its value out of "from", so that path is changed too
+            paths = [operation.get("path")]
+            if op == "move" or "from" in operation:
+                paths.append(operation.get("from"))
+            for path in paths:
+                if not isinstance(path, str) or not path.startswith("/"):
+                    raise ValueError(f"Patch path must start with '/': {path}")
+                if path.split("/")[1] in ("id", "team_id") or path.startswith("/_"):
+                    raise ValueError(f"Patch path cannot change {path}")
+        item_id = item_id or self._team_item_id(team_id)
+        if item_id is None:
+            return {"error": "Team not found"}
+        container = self.get_container("agent_teams")
+        conditions = {"etag": if_match, "match_condition": MatchConditions.IfNotModified} if if_match else {}
+        try:
+            response = self._call(container, "patch_team", "patch_item",
+                                  item=item_id, partition_key=team_id, patch_operations=operations, **conditions)
+        except CosmosResourceNotFoundError:
+            return {"error": "Team not found"}
         return response
 
     def delete_team(self, team_id: str):
@@ -259,35 +784,56 @@ class CosmosDB:
         existing_team = self.get_team(team_id)
         if not existing_team:
             return {"error": "Team not found"}
-        response = container.delete_item(item=existing_team["id"], partition_key=existing_team["team_id"])
+        response = self._call(container, "delete_team", "delete_item", item=existing_team["id"], partition_key=existing_team["team_id"])
         return response
 
+    def upsert_teams(self, teams: List[dict]):
+        """Bulk upsert team definitions; re-running leaves the same documents."""
+        container = self.get_container("agent_teams")
+        report = self.bulk.upsert_items(container, [self._team_document(team) for team in teams], "team_id", name="upsert_teams")
+        self._record_bulk("upsert_teams", report)
+        return report
+
     def initialize_teams(self):
         teams_folder = os.path.join(os.path.dirname(__file__), "./data/teams-definitions")
         json_files = glob.glob(os.path.join(teams_folder, "*.json"))
         json_files.sort()
         print(f"Found {len(json_files)} JSON files in {teams_folder}.")
-        created_items = 0
+        teams = []
         for file_path in json_files:
             with open(file_path, "r") as f:
-                team = json.load(f)
-            response = self.create_team(team)
-            print(f"Created team from {os.path.basename(file_path)}")
-            created_items += 1
-        print(f"Created {created_items}/{len(json_files)} items in the database.")
-        return f"Successfully created {created_items} teams."
+                teams.append(json.load(f))
+        report = self.upsert_teams(teams)
+        print(report.summary())
+        for error in report.errors:
+            print(f"  {error}")
+        print(f"Upserted {report.succeeded}/{len(json_files)} items in the database.")
+        return f"Successfully upserted {report.succeeded} teams."
+
 if __name__ == "__main__":
+    import sys
     db = CosmosDB()
-    teams_folder = os.path.join(os.path.dirname(__file__), "./data/teams-definitions")
-    json_files = glob.glob(os.path.join(teams_folder, "*.json"))
-    json_files.sort()
-    print(f"Found {len(json_files)} JSON files in {teams_folder}.")
-    created_items = 0
-    for file_path in json_files:
-        with open(file_path, "r") as f:
-            team = json.load(f)
-        response = db.create_team(team)
-        print(f"Created team from {os.path.basename(file_path)}")
-        created_items += 1
-    print(f"Created {created_items}/{len(json_files)} items in the database.")
-    pass
\ No newline at end of file
+    # python database.py provision
+    if len(sys.argv) > 1 and sys.argv[1] == "provision":
+        db.provision()
+        db.reconcile_indexing_policies()
+        sys.exit(0)
+    # python database.py migrate-partitioning --source ag_demo --target ag_demo_hpk
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate-partitioning":
+        import argparse
+        parser = argparse.ArgumentParser(description="Copy conversations into a (user_id, session_id) partitioned container.")
+        parser.add_argument("--source", default="ag_demo")
+        parser.add_argument("--target", required=True)
+        args = parser.parse_args(sys.argv[2:])
+        db.migrate_partitioning(args.source, args.target)
+        sys.exit(0)
+    # python database.py backfill-timestamps
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill-timestamps":
+        db.backfill_timestamp_epoch()
+        sys.exit(0)
+    # python database.py reconcile-indexes [--dry-run]
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcile-indexes":
+        db.reconcile_indexing_policies(dry_run="--dry-run" in sys.argv)
+        sys.exit(0)
+    db.provision()
+    db.initialize_teams()
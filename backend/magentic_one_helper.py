@@ -13,25 +13,18 @@ from autogen_ext.agents.web_surfer import MultimodalWebSurfer
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from autogen_ext.code_executors.azure import ACADynamicSessionsCodeExecutor
 from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
-from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
 from autogen_core import AgentId, AgentProxy, DefaultTopicId
 from autogen_core import SingleThreadedAgentRuntime
 from autogen_core import CancellationToken
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 import tempfile
 
-from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
 from dotenv import load_dotenv
 load_dotenv()
 
 from magentic_one_custom_agent import MagenticOneCustomAgent
 from magentic_one_custom_rag_agent import MagenticOneRAGAgent
 from magentic_one_custom_mcp_agent import MagenticOneCustomMCPAgent
-
-azure_credential = DefaultAzureCredential()
-token_provider = get_bearer_token_provider(
-    azure_credential, "https://cognitiveservices.azure.com/.default"
-)
+import model_clients
 
 def generate_session_name():
     '''Generate a unique session name based on random sci-fi words, e.g. quantum-cyborg-1234'''
@@ -61,7 +54,7 @@ def generate_session_name():
     return f"{adjective}-{noun}-{number}"
 
 class MagenticOneHelper:
-    def __init__(self, logs_dir: str = None, save_screenshots: bool = False, run_locally: bool = False, user_id: str = None) -> None:
+    def __init__(self, logs_dir: str = None, save_screenshots: bool = False, run_locally: bool = False, user_id: str = None, model_clients_registry: model_clients.ModelClientRegistry = None) -> None:
         """
         A helper class to interact with the MagenticOne system.
         Initialize MagenticOne instance.
@@ -70,6 +63,7 @@ class MagenticOneHelper:
             logs_dir: Directory to store logs and downloads
             save_screenshots: Whether to save screenshots of web pages
             user_id: The user ID associated with this helper instance
+            model_clients_registry: Shared model clients (the process-wide registry by default)
         """
         self.logs_dir = logs_dir or os.getcwd()
         self.runtime: Optional[SingleThreadedAgentRuntime] = None
@@ -78,9 +72,14 @@ class MagenticOneHelper:
         self.run_locally = run_locally
 
         self.user_id = user_id
+        self.model_clients = model_clients_registry or model_clients.registry
 
         self.max_rounds = 50
         self.max_time = 25 * 60
+        # Executors started for this session; stopped in close()
+        self.code_executors = []
+        self.agents = []
+        self.client = None
         self.max_stalls_before_replan = 5
         self.return_final_answer = True
         self.start_page = "https://www.bing.com"
@@ -100,36 +99,9 @@ class MagenticOneHelper:
             self.session_id = generate_session_name()
         else:
             self.session_id = session_id
-        # print(f"Session MODEL gpt-4.1-2025-04-14")
-        print(f"Session MODEL o4-mini-2025-04-16")
-        self.client = AzureOpenAIChatCompletionClient(
-            model="gpt-4.1-2025-04-14",
-            azure_deployment="gpt-4.1",
-            api_version="2025-03-01-preview",
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-            azure_ad_token_provider=token_provider,
-            model_info={
-                "vision": True,
-                "function_calling": True,
-                "json_output": True,
-                "family": "gpt-4o"
-            }
-        )
-
-        self.client_reasoning = AzureOpenAIChatCompletionClient(
-            model="o4-mini-2025-04-16",
-            azure_deployment="o4-mini",
-            api_version="2025-03-01-preview",
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-            azure_ad_token_provider=token_provider,
-            model_info={
-                "vision": True,
-                "function_calling": True,
-                "json_output": True,
-                "family": "o4"
-            }
-        )
-
+        print(f"Session MODEL gpt-4.1-2025-04-14")
+        # Shared across sessions; owned and closed by the model client registry
+        self.client = self.model_clients.get("gpt-4.1")
 
         # Set up agents
         self.agents = await self.setup_agents(agents, self.client, self.logs_dir) 
@@ -152,6 +124,7 @@ class MagenticOneHelper:
                     #docker
                     code_executor = DockerCommandLineCodeExecutor(work_dir=logs_dir)
                     await code_executor.start()
+                    self.code_executors.append(code_executor)
                     executor = CodeExecutorAgent("Executor", code_executor=code_executor)
                 
                 # or remote = Azure ACA Dynamic Sessions execution
@@ -161,9 +134,10 @@ class MagenticOneHelper:
                     with tempfile.TemporaryDirectory() as temp_dir:# Define the correct path to the data folder for file access
                         code_executor=ACADynamicSessionsCodeExecutor(
                             pool_management_endpoint=pool_endpoint,
-                            credential=azure_credential,
+                            credential=self.model_clients.credential,
                             work_dir=temp_dir
                         )
+                        self.code_executors.append(code_executor)
                         print(code_executor._session_id)
                         #code_executor.upload_files(os.path.join(os.getcwd(), "data"))
                         print("Files uploaded!")
@@ -226,11 +200,23 @@ class MagenticOneHelper:
                 raise ValueError('Unknown Agent!')
         return agent_list
 
+    async def close(self) -> None:
+        """Stop code executors and close browsers created for this session (model clients are shared)."""
+        resources = self.code_executors + [a for a in self.agents if hasattr(a, "close")]
+        for resource in resources:
+            try:
+                result = resource.stop() if resource in self.code_executors else resource.close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Error closing {type(resource).__name__}: {str(e)}")
+        self.code_executors = []
+
     def main(self, task):
         team = MagenticOneGroupChat(
             participants=self.agents,
             model_client=self.client,
-            # model_client=self.client_reasoning,
+            # model_client=self.model_clients.get("o4-mini"),
             max_turns=self.max_rounds,
             max_stalls=self.max_stalls_before_replan,
             emit_team_events=False,
@@ -0,0 +1,115 @@
+# File: message_buffer.py
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import crud
+from conversation_store import ConversationStore, FileConversationStore
+
+# Write-behind settings, overridable from the environment.
+MESSAGE_BUFFER_MAX_MESSAGES = int(os.getenv("MESSAGE_BUFFER_MAX_MESSAGES", "20"))
+MESSAGE_BUFFER_FLUSH_INTERVAL = float(os.getenv("MESSAGE_BUFFER_FLUSH_INTERVAL", "1.0"))
+MESSAGE_BUFFER_DURABILITY = os.getenv("MESSAGE_BUFFER_DURABILITY", crud.DURABILITY_FLUSH)
+
+
+class MessageBuffer:
+    def __init__(
+        self,
+        user_id: str,
+        session_id: str,
+        max_messages: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        durability: Optional[str] = None,
+        store: Optional[ConversationStore] = None,
+    ) -> None:
+        """
+        A per-session write-behind buffer for streamed chat messages.
+
+        Messages are queued in memory and written in batches from a background
+        task, so a slow disk never delays the SSE frame that produced them.
+        A batch is flushed when it reaches max_messages, when flush_interval
+        seconds have passed, or when the buffer is closed at stream end.
+
+        Args:
+            user_id: The user that owns the conversation
+            session_id: The conversation session id
+            max_messages: Number of queued messages that triggers a flush
+            flush_interval: Maximum seconds a message waits before it is flushed
+            durability: One of crud.DURABILITY_NONE, DURABILITY_FLUSH or DURABILITY_MESSAGE
+            store: ConversationStore the batches are appended to (file store by default)
+        """
+        self.user_id = user_id
+        self.session_id = session_id
+        self.max_messages = max_messages or MESSAGE_BUFFER_MAX_MESSAGES
+        self.flush_interval = flush_interval or MESSAGE_BUFFER_FLUSH_INTERVAL
+        self.durability = durability or MESSAGE_BUFFER_DURABILITY
+        self.store = store or FileConversationStore()
+
+        self._pending: List[dict] = []
+        # A batch whose write failed, with the seq reserved for it (if any)
+        self._failed: Optional[Tuple[List[dict], Optional[int]]] = None
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger("message_buffer")
+
+    def start(self) -> "MessageBuffer":
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def add(self, message: dict) -> None:
+        """Queue a message; never blocks on I/O."""
+        if self._closed:
+            raise RuntimeError(f"Message buffer for session {self.session_id} is closed")
+        self._pending.append(message)
+        if len(self._pending) >= self.max_messages:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        async with self._lock:
+            written = 0
+            if self._failed is not None:
+                # Retry at the seqs already reserved, so no message is stored twice
+                batch, start_seq = self._failed
+                self._failed = None
+                if not await self._write(batch, start_seq):
+                    return 0
+                written += len(batch)
+            if self._pending:
+                batch, self._pending = self._pending, []
+                if await self._write(batch, None):
+                    written += len(batch)
+            return written
+
+    async def _write(self, batch: List[dict], start_seq: Optional[int]) -> bool:
+        try:
+            if start_seq is None:
+                start_seq = await self.store.reserve_sequence(self.user_id, self.session_id, batch)
+            await self.store.append_messages(self.user_id, self.session_id, batch, self.durability, start_seq)
+            return True
+        except Exception as e:
+            # Keep the batch and its reservation so the next flush retries it
+            self._logger.error(f"Error flushing {len(batch)} messages for session {self.session_id}: {str(e)}")
+            self._failed = (batch, start_seq)
+            return False
+
+    async def close(self) -> None:
+        """Stop the background flusher and write everything still queued."""
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
@@ -0,0 +1,107 @@
+# File: model_clients.py
+import inspect
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-03-01-preview")
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# Models the teams can use, by deployment name
+MODELS = {
+    "gpt-4.1": {
+        "model": "gpt-4.1-2025-04-14",
+        "model_info": {"vision": True, "function_calling": True, "json_output": True, "family": "gpt-4o"},
+    },
+    "o4-mini": {
+        "model": "o4-mini-2025-04-16",
+        "model_info": {"vision": True, "function_calling": True, "json_output": True, "family": "o4"},
+    },
+}
+
+_logger = logging.getLogger("model_clients")
+
+
+class ModelClientRegistry:
+    def __init__(self, endpoint: Optional[str] = None, api_version: Optional[str] = None) -> None:
+        """
+        Process-wide Azure OpenAI model clients shared by all sessions.
+
+        Each distinct (deployment, api version, model info) gets one
+        AzureOpenAIChatCompletionClient, created on first use, so sessions
+        reuse its keep-alive connection pool instead of opening new
+        connections and TLS handshakes per run. All clients share one
+        credential and token provider, so AAD tokens are cached across
+        sessions too. close() is called from the FastAPI lifespan.
+
+        Args:
+            endpoint: Azure OpenAI endpoint (AZURE_OPENAI_ENDPOINT by default)
+            api_version: API version used when a caller doesn't pass one
+        """
+        self.endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.api_version = api_version or AZURE_OPENAI_API_VERSION
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple, AzureOpenAIChatCompletionClient] = {}
+        self._credential = None
+        self._token_provider = None
+
+    @property
+    def credential(self):
+        """The shared DefaultAzureCredential (also used for code executors)."""
+        with self._lock:
+            if self._credential is None:
+                self._credential = DefaultAzureCredential()
+            return self._credential
+
+    @property
+    def token_provider(self):
+        credential = self.credential
+        with self._lock:
+            if self._token_provider is None:
+                self._token_provider = get_bearer_token_provider(credential, COGNITIVE_SERVICES_SCOPE)
+            return self._token_provider
+
+    def get(self, deployment: str, api_version: Optional[str] = None, model: Optional[str] = None, model_info: Optional[dict] = None) -> AzureOpenAIChatCompletionClient:
+        """Shared client for a deployment; model and model_info default to the MODELS entry."""
+        spec = MODELS.get(deployment, {})
+        model = model or spec.get("model") or deployment
+        model_info = model_info or spec.get("model_info")
+        api_version = api_version or self.api_version
+        key = (deployment, api_version, model, tuple(sorted((model_info or {}).items())))
+        token_provider = self.token_provider
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = AzureOpenAIChatCompletionClient(
+                    model=model,
+                    azure_deployment=deployment,
+                    api_version=api_version,
+                    azure_endpoint=self.endpoint,
+                    azure_ad_token_provider=token_provider,
+                    model_info=model_info,
+                )
+                _logger.info(f"Created model client for {deployment} ({model}, {api_version})")
+            return client
+
+    async def close(self) -> None:
+        """Close every pooled client and the credential. The registry can be used again afterwards."""
+        with self._lock:
+            clients = list(self._clients.values())
+            credential = self._credential
+            self._clients = {}
+            self._credential = None
+            self._token_provider = None
+        for resource in clients + ([credential] if credential is not None else []):
+            try:
+                result = resource.close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                _logger.error(f"Error closing {type(resource).__name__}: {str(e)}")
+
+
+registry = ModelClientRegistry()
@@ -0,0 +1,276 @@
+# File: sqlite_store.py
+# SQLite conversation backend exposing the same functions as crud.py.
+import os, sys, json, time, random, sqlite3, tempfile, threading
+from typing import List, Optional
+
+SQLITE_STORE_PATH = os.getenv("SQLITE_STORE_PATH", "./data/conversations.sqlite3")
+
+_local = threading.local()
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        user_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        id TEXT,
+        agents TEXT,
+        run_mode_locally INTEGER,
+        timestamp TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        run_status TEXT,
+        PRIMARY KEY (user_id, session_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        user_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        PRIMARY KEY (user_id, session_id, seq)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user_timestamp ON conversations (user_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_session_seq ON messages (session_id, seq)",
+]
+
+# One connection per thread; the API runs calls on the persistence.run_blocking pool.
+def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or SQLITE_STORE_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    if path not in connections:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # isolation_level=None: transactions are opened explicitly with
+        # BEGIN IMMEDIATE so concurrent workers serialize their writes.
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            connection.execute(statement)
+        # Databases created before run_status was tracked
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(conversations)")}
+        if "run_status" not in columns:
+            connection.execute("ALTER TABLE conversations ADD COLUMN run_status TEXT")
+        connections[path] = connection
+    return connections[path]
+
+def _append(connection: sqlite3.Connection, id, user_id: str, session_id: str, messages: List[dict], agents, run_mode_locally, timestamp: str) -> int:
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute(
+            """
+            INSERT OR IGNORE INTO conversations (user_id, session_id, id, agents, run_mode_locally, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (user_id, session_id, str(id) if id is not None else None, json.dumps(agents), run_mode_locally, timestamp)
+        )
+        seq = connection.execute(
+            "SELECT message_count FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+        ).fetchone()[0]
+        connection.executemany(
+            "INSERT INTO messages (user_id, session_id, seq, message) VALUES (?, ?, ?, ?)",
+            [(user_id, session_id, seq + i, json.dumps(message)) for i, message in enumerate(messages)]
+        )
+        connection.execute(
+            "UPDATE conversations SET message_count = message_count + ? WHERE user_id = ? AND session_id = ?",
+            (len(messages), user_id, session_id)
+        )
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return seq
+
+def _conversation_from_row(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "session_id": row["session_id"],
+        "messages": [],
+        "agents": json.loads(row["agents"]) if row["agents"] is not None else None,
+        "run_mode_locally": bool(row["run_mode_locally"]) if row["run_mode_locally"] is not None else None,
+        "timestamp": row["timestamp"],
+        "run_status": row["run_status"]
+    }
+
+# Save a message to a conversation.
+# Returns the conversation header with only the appended message, like crud.save_message.
+def save_message(id: str, user_id: str, session_id: str, message: dict, agents: dict, run_mode_locally: bool, timestamp: str):
+    connection = get_connection()
+    _append(connection, id, user_id, session_id, [message], agents, run_mode_locally, timestamp)
+    row = connection.execute(
+        "SELECT * FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+    ).fetchone()
+    conversation = _conversation_from_row(row)
+    conversation["messages"].append(message)
+    return conversation
+
+# Append a batch of messages in one transaction. durability is accepted for
+# parity with crud.append_messages; WAL commits are already atomic.
+def append_messages(user_id: str, session_id: str, messages: List[dict], durability: str = None) -> int:
+    if not messages:
+        return 0
+    _append(get_connection(), None, user_id, session_id, messages, None, None, messages[0].get("time"))
+    return len(messages)
+
+# Retrieve a single conversation, optionally only messages [start_seq, end_seq).
+def get_conversation(user_id: str, session_id: str, start_seq: int = 0, end_seq: Optional[int] = None):
+    connection = get_connection()
+    row = connection.execute(
+        "SELECT * FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+    ).fetchone()
+    if row is None:
+        return None
+    conversation = _conversation_from_row(row)
+    rows = connection.execute(
+        """
+        SELECT message FROM messages
+        WHERE session_id = ? AND user_id = ? AND seq >= ? AND seq < ?
+        ORDER BY seq
+        """,
+        (session_id, user_id, start_seq, end_seq if end_seq is not None else row["message_count"])
+    ).fetchall()
+    conversation["messages"] = [json.loads(r["message"]) for r in rows]
+    return conversation
+
+# Record where the session's team run stands, like crud.set_run_status.
+def set_run_status(user_id: str, session_id: str, status: str) -> bool:
+    updated = get_connection().execute(
+        "UPDATE conversations SET run_status = ? WHERE user_id = ? AND session_id = ?", (status, user_id, session_id)
+    ).rowcount
+    return updated > 0
+
+# Nothing to fold: every message is already stored in its final place.
+def compact_conversation(user_id: str, session_id: str):
+    return get_conversation(user_id, session_id)
+
+# Page through conversation summaries, newest first.
+def list_conversations(user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> dict:
+    connection = get_connection()
+    where, parameters = ("WHERE c.user_id = ?", [user_id]) if user_id is not None else ("", [])
+    total_count = connection.execute(f"SELECT COUNT(1) FROM conversations c {where}", parameters).fetchone()[0]
+    total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
+    page = max(1, min(page, total_pages))
+    rows = connection.execute(
+        f"""
+        SELECT c.id, c.user_id, c.session_id, c.timestamp, c.message_count,
+               substr(json_extract(m.message, '$.content'), 1, 120) AS preview
+        FROM conversations c
+        LEFT JOIN messages m ON m.session_id = c.session_id AND m.user_id = c.user_id AND m.seq = 0
+        {where}
+        ORDER BY c.timestamp DESC, c.session_id
+        LIMIT ? OFFSET ?
+        """,
+        parameters + [page_size, (page - 1) * page_size]
+    ).fetchall()
+    return {
+        "conversations": [dict(r) for r in rows],
+        "total_count": total_count,
+        "page": page,
+        "total_pages": total_pages
+    }
+
+# List all conversations.
+def get_all_conversations(page: int = 1, page_size: int = 20) -> List[dict]:
+    return list_conversations(page=page, page_size=page_size)["conversations"]
+
+# List conversations for a particular user.
+def get_user_conversations(user_id: str, page: int = 1, page_size: int = 20):
+    return list_conversations(user_id=user_id, page=page, page_size=page_size)["conversations"]
+
+def delete_conversation(user_id: str, session_id: str) -> bool:
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("DELETE FROM messages WHERE session_id = ? AND user_id = ?", (session_id, user_id))
+        deleted = connection.execute(
+            "DELETE FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+        ).rowcount
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return deleted > 0
+
+# Import the JSON conversation documents written by crud.py.
+def migrate_from_files(source_dir: str) -> int:
+    import crud
+    crud.DATA_DIR = source_dir
+    connection = get_connection()
+    migrated = 0
+    for directory, stem in crud._conversation_locations():
+        try:
+            conversation = crud._load_location(directory, stem)
+        except (json.JSONDecodeError, ValueError, OSError):
+            print(f"Skipping unreadable conversation {stem}")
+            continue
+        if conversation is None:
+            continue
+        user_id, session_id = conversation["user_id"], conversation["session_id"]
+        exists = connection.execute(
+            "SELECT 1 FROM conversations WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+        ).fetchone()
+        if exists:
+            print(f"Conversation {user_id}/{session_id} already migrated, skipping")
+            continue
+        _append(connection, conversation.get("id"), user_id, session_id, conversation.get("messages", []),
+                conversation.get("agents"), conversation.get("run_mode_locally"), conversation.get("timestamp"))
+        migrated += 1
+    print(f"Migrated {migrated} conversations from {source_dir} into {SQLITE_STORE_PATH}.")
+    return migrated
+
+def benchmark(session_counts: List[int], messages_per_session: int = 10, users: int = 100, samples: int = 200) -> None:
+    import crud
+    global SQLITE_STORE_PATH
+    message = {"time": "2025-01-01 00:00:00", "type": "TextMessage", "source": "Coder", "content": "x" * 400}
+    for sessions in session_counts:
+        with tempfile.TemporaryDirectory() as work_dir:
+            crud.DATA_DIR = os.path.join(work_dir, "conversations")
+            SQLITE_STORE_PATH = os.path.join(work_dir, "conversations.sqlite3")
+            keys = [(f"user{i % users}", f"session-{i}") for i in range(sessions)]
+            lookups = random.sample(keys, min(samples, sessions))
+            for name, store in (("file", crud), ("sqlite", sys.modules[__name__])):
+                started = time.perf_counter()
+                for user_id, session_id in keys:
+                    store.save_message(id=session_id, user_id=user_id, session_id=session_id, message=message,
+                                       agents=[], run_mode_locally=False, timestamp="2025-01-01 00:00:00")
+                    store.append_messages(user_id, session_id, [message] * (messages_per_session - 1))
+                write_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                for user_id, session_id in lookups:
+                    store.get_conversation(user_id, session_id)
+                read_ms = (time.perf_counter() - started) / len(lookups) * 1000
+
+                started = time.perf_counter()
+                for user_id, _ in lookups:
+                    store.list_conversations(user_id=user_id, page=1, page_size=20)
+                list_ms = (time.perf_counter() - started) / len(lookups) * 1000
+
+                print(f"{name:>6} | {sessions:>7} sessions | write {write_seconds:8.2f}s "
+                      f"| get_conversation {read_ms:7.2f}ms | list page {list_ms:7.2f}ms")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="SQLite conversation store tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Import existing JSON conversation files")
+    migrate_parser.add_argument("--source", default="./data/conversations", help="Directory written by crud.py")
+    migrate_parser.add_argument("--db", default=SQLITE_STORE_PATH, help="Target SQLite database")
+    bench_parser = subparsers.add_parser("benchmark", help="Compare against the file store")
+    bench_parser.add_argument("--sessions", type=int, nargs="+", default=[10000, 100000])
+    bench_parser.add_argument("--messages", type=int, default=10, help="Messages per session")
+
+    # python sqlite_store.py migrate --source ./data/conversations
+    # python sqlite_store.py benchmark --sessions 10000 100000
+    args = parser.parse_args()
+    if args.command == "migrate":
+        SQLITE_STORE_PATH = args.db
+        migrate_from_files(args.source)
+    else:
+        benchmark(args.sessions, messages_per_session=args.messages)
@@ -0,0 +1,16 @@
+import crud
+
+
+def test_stress_concurrent_writers(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(crud, "DATA_DIR", str(tmp_path / "conversations"))
+    monkeypatch.setattr(crud, "_index", None)
+    assert crud.stress_test(processes=3, messages=40, compact_every=10)
+    report = capsys.readouterr().out
+    assert "kept 120/120, missing 0, duplicated 0, indexed 120" in report
+
+
+def test_extract_session_id_keeps_dots():
+    assert crud.extract_session_id("data/ab/cd/user_session.v2.json.zst") == "session.v2"
+    assert crud.extract_session_id("user_session.v2.jsonl") == "session.v2"
+    assert crud.extract_session_id("user_session.json.gz") == "session"
+    assert crud.extract_session_id("user_session.json") == "session"
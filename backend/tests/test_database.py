@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("azure.cosmos")
+pytest.importorskip("autogen_agentchat")
+
+from database import CosmosDB
+
+
+class FakePager:
+    def __init__(self, pages, hook):
+        self.pages = pages
+        self.hook = hook
+
+    def by_page(self):
+        for items, charge in self.pages:
+            # Like azure-cosmos 4.9.0: the hook fires with each page's own headers
+            self.hook({"x-ms-request-charge": str(charge), "x-ms-request-duration-ms": "1.5"}, items)
+            yield iter(items)
+
+
+class FakeContainer:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def query_items(self, response_hook=None, **kwargs):
+        # ...and once while the pager is built, with whatever request ran last on the client
+        response_hook({"x-ms-request-charge": "1000", "x-ms-request-duration-ms": "500"}, None)
+        return FakePager(self.pages, response_hook)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    recorded = []
+    monkeypatch.setattr("database.metrics.record", lambda operation, charge, client_ms, server_ms, *args: recorded.append((operation, charge, server_ms)))
+    cosmos = CosmosDB(provision=False)
+    cosmos.recorded = recorded
+    return cosmos
+
+
+def test_query_counts_only_its_own_pages(db):
+    container = FakeContainer([([{"id": "a"}, {"id": "b"}], 2.5), ([{"id": "c"}], 3.0)])
+    items = db._query(container, "test_query", "SELECT * FROM c", partition_key="p")
+    assert [item["id"] for item in items] == ["a", "b", "c"]
+    assert db.recorded == [("test_query", 5.5, 3.0)]
+    assert db.last_request_charge == 5.5
+
+
+def test_query_pages_reports_each_page(db):
+    container = FakeContainer([([{"id": "a"}], 2.0), ([{"id": "b"}], 4.0)])
+    pages = list(db._query_pages(container, query="SELECT * FROM c"))
+    assert [(len(items), charge, server_ms) for items, charge, server_ms in pages] == [(1, 2.0, 1.5), (1, 4.0, 1.5)]
+
+
+@pytest.mark.parametrize("operations", [
+    "name",
+    42,
+    ["set /name"],
+    [{"op": "set", "path": "/name"}],
+    [{"op": "move", "path": "/name"}],
+    [{"op": "move", "from": "/team_id", "path": "/old_id"}],
+    [{"op": "set", "path": 3, "value": "x"}],
+    [{"op": "set", "path": "/name", "value": "x", "extra": 1}],
+])
+def test_patch_team_rejects_malformed_operations(db, operations):
+    with pytest.raises(ValueError):
+        db.patch_team("team", operations, item_id="item")
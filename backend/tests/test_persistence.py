@@ -0,0 +1,17 @@
+import asyncio
+
+import crud
+import persistence
+
+# Offloaded p99 lag allowed even on a disk fast enough that inline writes barely stall the loop
+LAG_BOUND_MS = 50.0
+
+
+def test_offloading_keeps_event_loop_responsive(tmp_path, monkeypatch):
+    monkeypatch.setattr(crud, "DATA_DIR", str(tmp_path))
+    try:
+        inline = asyncio.run(persistence.measure_event_loop_lag(streams=20, messages=20, offload=False))
+        offloaded = asyncio.run(persistence.measure_event_loop_lag(streams=20, messages=20, offload=True))
+    finally:
+        persistence.shutdown()
+    assert offloaded["p99_ms"] < max(inline["p99_ms"], LAG_BOUND_MS)
@@ -0,0 +1,76 @@
+import asyncio
+
+from session_registry import EventRingBuffer
+
+
+def collect(buffer, last_event_id=0, backfill=None):
+    async def run():
+        return [event async for event in buffer.read(last_event_id, backfill)]
+    return asyncio.run(run())
+
+
+def test_deltas_do_not_evict_persisted_events():
+    buffer = EventRingBuffer(maxlen=3)
+    for i in range(3):
+        buffer.append(f"message {i + 1}")
+    for i in range(10):
+        buffer.append(f"delta {i}", persisted=False)
+    buffer.close()
+    events = collect(buffer)
+    assert [e for e in events if e[0] is not None] == [(1, "message 1"), (2, "message 2"), (3, "message 3")]
+    assert len([e for e in events if e[0] is None]) == 3
+
+
+def test_persisted_event_drops_the_deltas_before_it():
+    buffer = EventRingBuffer()
+    buffer.append("delta", persisted=False)
+    buffer.append("message 1")
+    buffer.append("next delta", persisted=False)
+    buffer.close()
+    assert collect(buffer) == [(1, "message 1"), (None, "next delta")]
+    assert collect(buffer, last_event_id=1) == [(None, "next delta")]
+
+
+def test_dropped_events_are_backfilled():
+    buffer = EventRingBuffer(maxlen=2)
+    for i in range(5):
+        buffer.append(f"message {i + 1}")
+    buffer.close()
+    requested = []
+
+    async def backfill(start_seq, end_seq):
+        requested.append((start_seq, end_seq))
+        for seq in range(start_seq, end_seq):
+            yield seq, f"stored {seq}"
+
+    assert collect(buffer, 1, backfill) == [(2, "stored 2"), (3, "stored 3"), (4, "message 4"), (5, "message 5")]
+    assert requested == [(2, 4)]
+
+
+def test_missing_backfill_does_not_loop():
+    buffer = EventRingBuffer(maxlen=1)
+    for i in range(3):
+        buffer.append(f"message {i + 1}")
+    buffer.close()
+
+    async def backfill(start_seq, end_seq):
+        return
+        yield
+
+    assert collect(buffer, 0, backfill) == [(3, "message 3")]
+
+
+def test_reader_follows_live_events():
+    async def run():
+        buffer = EventRingBuffer()
+        buffer.append("message 1")
+        reader = buffer.read(0)
+        assert await reader.__anext__() == (1, "message 1")
+        pending = asyncio.ensure_future(reader.__anext__())
+        await asyncio.sleep(0)
+        buffer.append("delta", persisted=False)
+        assert await pending == (None, "delta")
+        buffer.append("message 2")
+        buffer.close()
+        assert [event async for event in reader] == [(2, "message 2")]
+    asyncio.run(run())
@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import crud
+import sqlite_store
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "conversations.sqlite3")
+    monkeypatch.setattr(sqlite_store, "SQLITE_STORE_PATH", path)
+    return path
+
+
+def save_task(user_id, session_id, timestamp="2025-01-01 00:00:00"):
+    return sqlite_store.save_message(id=session_id, user_id=user_id, session_id=session_id,
+                                     message={"content": f"task {session_id}", "time": timestamp},
+                                     agents=[{"name": "Coder"}], run_mode_locally=False, timestamp=timestamp)
+
+
+def test_append_get_list_round_trip(store_path):
+    save_task("u1", "s1", "2025-01-01 00:00:00")
+    save_task("u1", "s2", "2025-01-02 00:00:00")
+    save_task("u2", "s3")
+    assert sqlite_store.append_messages("u1", "s1", [{"content": "a"}, {"content": "b"}]) == 2
+
+    conversation = sqlite_store.get_conversation("u1", "s1")
+    assert [m["content"] for m in conversation["messages"]] == ["task s1", "a", "b"]
+    assert conversation["agents"] == [{"name": "Coder"}]
+    assert conversation["run_mode_locally"] is False
+    assert [m["content"] for m in sqlite_store.get_conversation("u1", "s1", 1, 2)["messages"]] == ["a"]
+    assert sqlite_store.get_conversation("u1", "missing") is None
+
+    page = sqlite_store.list_conversations(user_id="u1", page=1, page_size=1)
+    assert page["total_count"] == 2 and page["total_pages"] == 2
+    assert [(c["session_id"], c["message_count"], c["preview"]) for c in page["conversations"]] == [("s2", 1, "task s2")]
+    assert sqlite_store.list_conversations()["total_count"] == 3
+
+    assert sqlite_store.delete_conversation("u1", "s1")
+    assert sqlite_store.get_conversation("u1", "s1") is None
+    assert not sqlite_store.delete_conversation("u1", "s1")
+
+
+def test_concurrent_appends_get_distinct_seqs(store_path):
+    save_task("u", "s")
+    writers, messages = 4, 25
+
+    def write(worker):
+        for i in range(messages):
+            sqlite_store.append_messages("u", "s", [{"content": f"{worker}:{i}"}])
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    contents = [m["content"] for m in sqlite_store.get_conversation("u", "s")["messages"][1:]]
+    assert sorted(contents) == sorted(f"{w}:{i}" for w in range(writers) for i in range(messages))
+    for worker in range(writers):
+        own = [c for c in contents if c.startswith(f"{worker}:")]
+        assert own == [f"{worker}:{i}" for i in range(messages)]
+
+
+def test_run_status(store_path):
+    assert not sqlite_store.set_run_status("u", "s", "running")
+    save_task("u", "s")
+    assert sqlite_store.get_conversation("u", "s")["run_status"] is None
+    assert sqlite_store.set_run_status("u", "s", "finished")
+    assert sqlite_store.get_conversation("u", "s")["run_status"] == "finished"
+
+
+def test_run_status_column_added_to_existing_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE conversations (
+            user_id TEXT NOT NULL, session_id TEXT NOT NULL, id TEXT, agents TEXT,
+            run_mode_locally INTEGER, timestamp TEXT, message_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, session_id)
+        )
+    """)
+    connection.commit()
+    connection.close()
+    monkeypatch.setattr(sqlite_store, "SQLITE_STORE_PATH", path)
+    save_task("u", "s")
+    assert sqlite_store.set_run_status("u", "s", "stopped")
+    assert sqlite_store.get_conversation("u", "s")["run_status"] == "stopped"
+
+
+def test_migrate_from_files(store_path, tmp_path, monkeypatch):
+    source = tmp_path / "files"
+    source.mkdir()
+    monkeypatch.setattr(crud, "DATA_DIR", str(source))
+    monkeypatch.setattr(crud, "_index", None)
+    # One compacted document in the old flat layout, one live log in a shard
+    (source / "u1_s1.json").write_text(json.dumps({
+        "id": "s1", "user_id": "u1", "session_id": "s1", "agents": [], "run_mode_locally": True,
+        "timestamp": "2025-01-01 00:00:00", "messages": [{"content": "task"}, {"content": "answer"}],
+    }))
+    crud.save_message(id="s2", user_id="u2", session_id="s2", message={"content": "other task"},
+                      agents=[], run_mode_locally=False, timestamp="2025-01-02 00:00:00")
+    (source / "notes.txt").write_text("not a conversation")
+
+    assert sqlite_store.migrate_from_files(str(source)) == 2
+    migrated = sqlite_store.get_conversation("u1", "s1")
+    assert [m["content"] for m in migrated["messages"]] == ["task", "answer"]
+    assert migrated["run_mode_locally"] is True
+    assert [m["content"] for m in sqlite_store.get_conversation("u2", "s2")["messages"]] == ["other task"]
+    # Already migrated conversations are skipped on a second run
+    assert sqlite_store.migrate_from_files(str(source)) == 0
@@ -0,0 +1,83 @@
+from team_catalog import TeamCatalog
+
+
+class FakePages:
+    def __init__(self, pages, continuation_token):
+        self._pages = iter(pages)
+        self._final_token = continuation_token
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return iter(next(self._pages))
+        except StopIteration:
+            self.continuation_token = self._final_token
+            raise
+
+
+class FakeFeed:
+    def __init__(self, pages, continuation_token):
+        self.pages = pages
+        self.continuation_token = continuation_token
+
+    def by_page(self, continuation_token=None):
+        return FakePages(self.pages, self.continuation_token)
+
+
+class FakeContainer:
+    """Change feed over a list of writes; a continuation is the number of writes already read."""
+
+    def __init__(self):
+        self.writes = []
+        self.calls = []
+
+    def query_items_change_feed(self, continuation=None, is_start_from_beginning=False, **kwargs):
+        self.calls.append(continuation)
+        start = int(continuation.split(":")[1]) if continuation is not None else len(self.writes)
+        changed = self.writes[start:]
+        return FakeFeed([changed] if changed else [], f"token:{len(self.writes)}")
+
+
+class FakeDB:
+    def __init__(self, teams):
+        self.teams = teams
+        self.container = FakeContainer()
+        self.reloads = 0
+
+    def get_teams(self):
+        self.reloads += 1
+        return list(self.teams)
+
+    def get_container(self, name):
+        return self.container
+
+
+def test_incremental_refresh_returns_only_changed_teams():
+    db = FakeDB([{"id": "1", "team_id": "a", "name": "A"}, {"id": "2", "team_id": "b", "name": "B"}])
+    catalog = TeamCatalog(db, ttl=0, max_age=3600)
+    teams, first_etag = catalog.list_teams()
+    assert [team["name"] for team in teams] == ["A", "B"]
+
+    db.container.writes.append({"id": "2", "team_id": "b", "name": "B2", "_etag": "e2"})
+    teams, second_etag = catalog.list_teams()
+    assert [team["name"] for team in teams] == ["A", "B2"]
+    assert second_etag != first_etag
+    assert db.container.calls == [None, "token:0"]
+
+    # Nothing new: the same continuation comes back and no reload happens
+    teams, third_etag = catalog.list_teams()
+    assert third_etag == second_etag
+    assert db.container.calls == [None, "token:0", "token:1"]
+    assert db.reloads == 1
+
+
+def test_missing_continuation_reloads():
+    db = FakeDB([{"id": "1", "team_id": "a", "name": "A"}])
+    catalog = TeamCatalog(db, ttl=0, max_age=3600)
+    catalog.list_teams()
+    db.container.query_items_change_feed = lambda **kwargs: FakeFeed([], None)
+    catalog.list_teams()
+    assert db.reloads == 2
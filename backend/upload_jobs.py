@@ -0,0 +1,157 @@
+# File: upload_jobs.py
+import asyncio
+import copy
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Ingestion jobs run at once; each uploads blobs and then polls the indexer.
+UPLOAD_MAX_WORKERS = int(os.getenv("UPLOAD_MAX_WORKERS", "2"))
+# Seconds a finished job's status stays available.
+UPLOAD_JOB_RETAIN = float(os.getenv("UPLOAD_JOB_RETAIN", "3600"))
+
+PHASES = ("upload", "provisioning", "indexing")
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+_logger = logging.getLogger("upload_jobs")
+
+
+class UploadJob:
+    def __init__(self, index_name: str, filenames: List[str]) -> None:
+        self.id = uuid.uuid4().hex
+        self.index_name = index_name
+        self.filenames = filenames
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at: Optional[float] = None
+        self.phases: Dict[str, dict] = {phase: {"status": "pending"} for phase in PHASES}
+        # Bumped on every change so watchers can tell snapshots apart
+        self.version = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_json(self) -> dict:
+        return {
+            "job_id": self.id,
+            "index_name": self.index_name,
+            "filenames": self.filenames,
+            "status": self.status,
+            "error": self.error,
+            "phases": copy.deepcopy(self.phases),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class UploadJobManager:
+    def __init__(self, max_workers: int = None, retain: float = None) -> None:
+        """
+        Runs document upload and indexing jobs off the event loop.
+
+        submit() returns at once with a job; the ingestion function runs
+        on a small thread pool and reports progress per phase (upload,
+        provisioning, indexing) through a callback. get() returns the
+        latest status and watch() yields a snapshot on every change.
+
+        Args:
+            max_workers: Jobs running at once
+            retain: Seconds a finished job stays queryable
+        """
+        self.max_workers = max_workers or UPLOAD_MAX_WORKERS
+        self.retain = UPLOAD_JOB_RETAIN if retain is None else retain
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, UploadJob] = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="upload-job")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed = asyncio.Event()
+
+    def submit(self, index_name: str, documents: List[Tuple[str, bytes]], ingest: Callable) -> UploadJob:
+        """
+        Start ingest(index_name, documents, progress) in the background.
+        documents are (filename, contents) pairs, read before the request ends.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._purge()
+        job = UploadJob(index_name, [filename for filename, _ in documents])
+        with self._lock:
+            self._jobs[job.id] = job
+        self._loop.run_in_executor(self._executor, self._run, job, documents, ingest)
+        _logger.info(f"Upload job {job.id} queued for index {index_name} ({len(documents)} files)")
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_json() if job is not None else None
+
+    async def watch(self, job_id: str):
+        """Yield the job's status on every change, ending after it succeeds or fails."""
+        version = None
+        while True:
+            # Taken before reading the job so no change is missed
+            changed = self._changed
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                snapshot = job.to_json() if job.version != version else None
+                version, done = job.version, job.done
+            if snapshot is not None:
+                yield snapshot
+            if done:
+                return
+            await changed.wait()
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: UploadJob, documents: List[Tuple[str, bytes]], ingest: Callable) -> None:
+        self._update(job, status="running")
+        try:
+            ingest(job.index_name, documents, progress=lambda phase, **fields: self._progress(job, phase, fields))
+            self._update(job, status="succeeded")
+            _logger.info(f"Upload job {job.id} for index {job.index_name} succeeded")
+        except Exception as e:
+            # Mark the phase that was running as failed
+            with self._lock:
+                for phase in PHASES:
+                    if job.phases[phase]["status"] == "running":
+                        job.phases[phase]["status"] = "failed"
+            self._update(job, status="failed", error=str(e))
+            _logger.error(f"Upload job {job.id} for index {job.index_name} failed: {str(e)}")
+
+    def _progress(self, job: UploadJob, phase: str, fields: dict) -> None:
+        with self._lock:
+            job.phases[phase].update(fields)
+        self._update(job)
+
+    def _update(self, job: UploadJob, **fields) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+            if job.done and job.finished_at is None:
+                job.finished_at = job.updated_at
+            job.version += 1
+        # Progress arrives on worker threads; wake watchers on the event loop
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._notify)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _purge(self) -> None:
+        now = time.time()
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished_at is not None and now - j.finished_at > self.retain]:
+                del self._jobs[job_id]
@@ -0,0 +1,176 @@
+# File: admission.py
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Teams running at once on this replica; each holds executors, maybe a browser, and LLM quota.
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "4"))
+# Sessions (running or waiting) one user may have at once.
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "2"))
+# Sessions allowed to wait for a free slot; beyond this requests get 429.
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "20"))
+# Assumed run length (seconds) for Retry-After until real runs have been measured.
+ADMISSION_DEFAULT_RUN_SECONDS = float(os.getenv("ADMISSION_DEFAULT_RUN_SECONDS", "120"))
+
+_logger = logging.getLogger("admission")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, controller: "AdmissionController", session_id: str, user_id: str) -> None:
+        self.controller = controller
+        self.session_id = session_id
+        self.user_id = user_id
+        self.enqueued_at = time.time()
+        self.admitted_at: Optional[float] = None
+        self.released = False
+        self._admitted = asyncio.Event()
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.is_set()
+
+    @property
+    def position(self) -> int:
+        """1-based place in the wait queue, 0 once admitted."""
+        return self.controller.position(self)
+
+    async def wait(self) -> None:
+        """Wait until the session may start."""
+        await self._admitted.wait()
+
+    async def watch(self):
+        """Yield the queue status each time it changes, until the session is admitted or dropped."""
+        last = None
+        while not self.admitted and not self.released:
+            # Taken before reading the status so no change is missed
+            changed = self.controller._changed
+            status = {
+                "session_id": self.session_id,
+                "position": self.position,
+                "queued": len(self.controller._waiting),
+                "retry_after": self.controller.estimate_wait(self.position),
+            }
+            if status != last:
+                yield status
+                last = status
+            await changed.wait()
+
+    def _admit(self) -> None:
+        self.admitted_at = time.time()
+        self._admitted.set()
+
+
+class AdmissionController:
+    def __init__(self, max_sessions: int = None, max_per_user: int = None, max_queue: int = None) -> None:
+        """
+        Limits how many agent teams run at once on this replica.
+
+        At most max_sessions teams run concurrently. Further sessions wait
+        in a bounded FIFO queue and start in arrival order as slots free
+        up. Each user may hold max_per_user sessions, running or waiting.
+        try_enter() raises AdmissionRejected with a Retry-After estimate
+        when the queue or the user's quota is full.
+
+        Args:
+            max_sessions: Teams running at once
+            max_per_user: Running plus waiting sessions per user
+            max_queue: Sessions allowed to wait
+        """
+        self.max_sessions = max_sessions or ADMISSION_MAX_SESSIONS
+        self.max_per_user = max_per_user or ADMISSION_MAX_PER_USER
+        self.max_queue = ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self._running: Dict[str, Ticket] = {}
+        self._waiting: "OrderedDict[str, Ticket]" = OrderedDict()
+        self._per_user: Dict[str, int] = {}
+        self._changed = asyncio.Event()
+        # Moving average of run durations, for Retry-After and queue estimates
+        self._run_seconds = ADMISSION_DEFAULT_RUN_SECONDS
+
+    def try_enter(self, session_id: str, user_id: str) -> Ticket:
+        """Admit the session or queue it; raises AdmissionRejected when neither is possible."""
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            raise AdmissionRejected(
+                f"User {user_id} already has {self.max_per_user} sessions running or waiting",
+                self.estimate_wait(1),
+            )
+        ticket = Ticket(self, session_id, user_id)
+        if len(self._running) < self.max_sessions and not self._waiting:
+            self._running[session_id] = ticket
+            ticket._admit()
+        elif len(self._waiting) < self.max_queue:
+            self._waiting[session_id] = ticket
+            _logger.info(f"Session {session_id} queued at position {len(self._waiting)}")
+        else:
+            raise AdmissionRejected(
+                f"{len(self._running)} sessions running and {len(self._waiting)} waiting",
+                self.estimate_wait(len(self._waiting) + 1),
+            )
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self._notify()
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        """Give back a running or waiting session's place and admit the next one. Idempotent."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if self._running.get(ticket.session_id) is ticket:
+            del self._running[ticket.session_id]
+            if ticket.admitted_at is not None:
+                self._run_seconds = 0.8 * self._run_seconds + 0.2 * (time.time() - ticket.admitted_at)
+        elif self._waiting.get(ticket.session_id) is ticket:
+            del self._waiting[ticket.session_id]
+        remaining = self._per_user.get(ticket.user_id, 1) - 1
+        if remaining > 0:
+            self._per_user[ticket.user_id] = remaining
+        else:
+            self._per_user.pop(ticket.user_id, None)
+        while self._waiting and len(self._running) < self.max_sessions:
+            session_id, waiting = self._waiting.popitem(last=False)
+            self._running[session_id] = waiting
+            waiting._admit()
+            _logger.info(f"Session {session_id} admitted after {waiting.admitted_at - waiting.enqueued_at:.1f}s in the queue")
+        self._notify()
+
+    def waiting(self, session_id: str) -> Optional[Ticket]:
+        return self._waiting.get(session_id)
+
+    def position(self, ticket: Ticket) -> int:
+        if ticket.admitted:
+            return 0
+        for index, session_id in enumerate(self._waiting):
+            if session_id == ticket.session_id:
+                return index + 1
+        return 0
+
+    def estimate_wait(self, position: int) -> int:
+        """Seconds until a session at this queue position is likely to start."""
+        if position <= 0:
+            return 0
+        return max(1, math.ceil(self._run_seconds * math.ceil(position / self.max_sessions)))
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "waiting": len(self._waiting),
+            "max_sessions": self.max_sessions,
+            "max_per_user": self.max_per_user,
+            "max_queue": self.max_queue,
+            "average_run_seconds": round(self._run_seconds, 1),
+        }
+
+    def _notify(self) -> None:
+        # Wake every watch() so queue positions are re-sent
+        self._changed.set()
+        self._changed = asyncio.Event()
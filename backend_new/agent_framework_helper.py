@@ -11,11 +11,11 @@ from agent_framework import (
     MagenticFinalResultEvent, WorkflowCompletedEvent, WorkflowOutputEvent,
     HostedCodeInterpreterTool, HostedWebSearchTool, ai_function, MCPStdioTool
 )
-from agent_framework.azure import AzureOpenAIChatClient
-from azure.identity import DefaultAzureCredential
 from dotenv import load_dotenv
 import random
 
+import model_clients
+
 load_dotenv()
 
 def generate_session_name():
@@ -55,8 +55,40 @@ class StreamingEvent:
     stop_reason: Optional[str] = None
     content_image: Optional[str] = None
 
+# Token-level deltas are only streamed to the client; the consolidated
+# agent_message that follows them carries the same text and is what gets
+# persisted.
+DELTA_EVENT_TYPE = "agent_delta"
+PERSISTED_EVENT_TYPES = {
+    "orchestrator",
+    "agent_message",
+    "final_result",
+    "workflow_output",
+    "workflow_completed",
+}
+
+def is_persisted_event(event_type: str) -> bool:
+    """Whether a streamed event of this type is written to the conversation store"""
+    return event_type in PERSISTED_EVENT_TYPES
+
+def expand_agent_deltas(messages: List[Dict[str, Any]], chunk_size: int = 32):
+    """
+    Rebuild the delta view of a stored conversation.
+
+    Yields the stored messages in order, preceding each consolidated
+    agent_message with agent_delta messages that re-split its text into
+    chunk_size pieces. The original token boundaries are not stored, so the
+    chunks only approximate what was streamed live.
+    """
+    for message in messages:
+        if message.get("type") == "agent_message" and message.get("content"):
+            content = message["content"]
+            for start in range(0, len(content), chunk_size):
+                yield {**message, "type": DELTA_EVENT_TYPE, "content": content[start:start + chunk_size]}
+        yield message
+
 class AgentFrameworkHelper:
-    def __init__(self, logs_dir: str = None, save_screenshots: bool = False, run_locally: bool = False, user_id: str = None) -> None:
+    def __init__(self, logs_dir: str = None, save_screenshots: bool = False, run_locally: bool = False, user_id: str = None, model_clients_registry: model_clients.ModelClientRegistry = None) -> None:
         """
         A helper class to interact with the Microsoft Agent Framework.
         Initialize Agent Framework instance.
@@ -66,6 +98,7 @@ class AgentFrameworkHelper:
             save_screenshots: Whether to save screenshots of web pages
             run_locally: Whether to run code execution locally or on Azure
             user_id: The user ID associated with this helper instance
+            model_clients_registry: Shared chat clients (the process-wide registry by default)
         """
         self.logs_dir = logs_dir or os.getcwd()
         self.save_screenshots = save_screenshots
@@ -80,8 +113,8 @@ class AgentFrameworkHelper:
         if not os.path.exists(self.logs_dir):
             os.makedirs(self.logs_dir)
 
-        # Initialize Azure credential
-        self.azure_credential = DefaultAzureCredential()
+        # Chat clients and the Azure credential are shared across sessions
+        self.model_clients = model_clients_registry or model_clients.registry
 
     async def initialize(self, agents, session_id=None) -> None:
         """
@@ -95,12 +128,8 @@ class AgentFrameworkHelper:
             
         print(f"Session MODEL: gpt-4o using Agent Framework")
 
-        # Create Azure OpenAI chat client
-        self.chat_client = AzureOpenAIChatClient(
-            model_id="gpt-4o",
-            endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-            credential=self.azure_credential,
-        )
+        # Shared Azure OpenAI chat client; owned and closed by the model client registry
+        self.chat_client = self.model_clients.get("gpt-4o")
 
         # Set up agents
         self.agents = await self.setup_agents(agents, self.chat_client, self.logs_dir)
@@ -241,7 +270,7 @@ class AgentFrameworkHelper:
                     time=self._get_current_time(),
                     session_id=self.session_id,
                     session_user=self.user_id,
-                    event_type="agent_delta", 
+                    event_type=DELTA_EVENT_TYPE,
                     source=event.agent_id,
                     content=event.text,
                 ))
@@ -288,6 +317,19 @@ class AgentFrameworkHelper:
         
         return workflow
 
+    async def close(self) -> None:
+        """Close agents created for this session; the chat client and credential are shared and stay open."""
+        for resource in getattr(self, "agents", None) or []:
+            close = getattr(resource, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Error closing {type(resource).__name__}: {str(e)}")
+
     def main(self, task):
         """Create and return the workflow stream for a given task"""
         async def _event_stream():
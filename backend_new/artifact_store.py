@@ -0,0 +1,165 @@
+# File: artifact_store.py
+import base64
+import hashlib
+import os
+import re
+import uuid
+from typing import Optional, Tuple
+
+# Where artifacts live: "local" (ARTIFACTS_DIR) or "blob" (Azure Storage)
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "local")
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "./data/artifacts")
+ARTIFACT_CONTAINER = os.getenv("ARTIFACT_CONTAINER", "artifacts")
+# Prefix for the references stored in messages, e.g. https://api.example.com
+ARTIFACT_BASE_URL = os.getenv("ARTIFACT_BASE_URL", "")
+ARTIFACT_ROUTE = "/artifacts/"
+
+DATA_URI_PATTERN = re.compile(r"^data:(?P<content_type>[\w/+.-]+);base64,(?P<data>.+)$", re.DOTALL)
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+_MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+_store = None
+
+
+def sniff_content_type(data: bytes) -> str:
+    for magic, content_type in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class LocalArtifactStore:
+    def __init__(self, root: str = ARTIFACTS_DIR) -> None:
+        """
+        Content-addressed artifact store on local disk.
+
+        Each artifact is saved once under root/<hash[:2]>/<hash>, where hash
+        is the SHA-256 of its bytes, so repeated screenshots are deduplicated.
+
+        Args:
+            root: Directory to store artifacts in
+        """
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class BlobArtifactStore:
+    def __init__(self, container_client) -> None:
+        """
+        Content-addressed artifact store in an Azure Storage blob container.
+
+        Args:
+            container_client: azure.storage.blob ContainerClient for the artifacts container
+        """
+        self.container_client = container_client
+
+    def put(self, data: bytes) -> str:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            self.container_client.upload_blob(
+                digest, data, overwrite=False,
+                content_settings=ContentSettings(content_type=sniff_content_type(data))
+            )
+        except ResourceExistsError:
+            pass
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return self.container_client.download_blob(digest).readall()
+        except ResourceNotFoundError:
+            return None
+
+
+def get_artifact_store():
+    """The process-wide artifact store selected by ARTIFACT_STORE."""
+    global _store
+    if _store is None:
+        if ARTIFACT_STORE == "blob":
+            from azure.identity import DefaultAzureCredential
+            from azure.storage.blob import BlobServiceClient
+            blob_service_client = BlobServiceClient(
+                account_url=os.environ["AZURE_STORAGE_ACCOUNT_ENDPOINT"], credential=DefaultAzureCredential()
+            )
+            container_client = blob_service_client.get_container_client(ARTIFACT_CONTAINER)
+            if not container_client.exists():
+                container_client.create_container()
+            _store = BlobArtifactStore(container_client)
+        else:
+            _store = LocalArtifactStore()
+    return _store
+
+
+def artifact_reference(digest: str) -> str:
+    return f"{ARTIFACT_BASE_URL}{ARTIFACT_ROUTE}{digest}"
+
+
+def externalize_data_uri(data_uri: Optional[str], store=None) -> Optional[str]:
+    """Move a base64 data: URI into the artifact store and return its short reference."""
+    if not data_uri:
+        return data_uri
+    match = DATA_URI_PATTERN.match(data_uri)
+    if not match:
+        return data_uri
+    try:
+        data = base64.b64decode(match.group("data"), validate=False)
+    except ValueError:
+        return data_uri
+    digest = (store or get_artifact_store()).put(data)
+    return artifact_reference(digest)
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" Range header into an inclusive (start, end).
+
+    Returns None when the header is absent or not a single byte range, and
+    raises ValueError when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    else:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length <= 0:
+            raise ValueError("Empty suffix range")
+        start, end = max(size - length, 0), size - 1
+    end = min(end, size - 1)
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
@@ -1,94 +1,474 @@
 # File: crud.py
-import os, json, uuid
+import os, json, uuid, gzip, shutil, hashlib
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+
+from conversation_index import ConversationIndex
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    # No POSIX file locks (Windows): safe for a single writer process only
+    fcntl = None
 
 DATA_DIR = "./data/conversations"
 
+# Conversations are kept as an append-only JSONL log while a session is live:
+# the first line is a "header" record, every message is one "message" record
+# and run status changes are "status" records. compact_conversation() folds
+# the log into the consolidated document that older sessions are stored as.
+#
+# Files live in DATA_DIR/<h[0:2]>/<h[2:4]>/ where h is the SHA-256 of
+# "user_id/session_id", so no directory grows past a few hundred entries.
+# Compacted documents are compressed with CONVERSATION_COMPRESSION
+# ("zstd" when the zstandard package is installed, else "gzip", or "none").
+LOG_EXTENSION = ".jsonl"
+DOCUMENT_EXTENSION = ".json"
+COMPRESSION_EXTENSIONS = {"zstd": ".json.zst", "gzip": ".json.gz", "none": DOCUMENT_EXTENSION}
+DOCUMENT_EXTENSIONS = (".json.zst", ".json.gz", DOCUMENT_EXTENSION)
+CONVERSATION_COMPRESSION = os.getenv("CONVERSATION_COMPRESSION", "zstd" if zstandard is not None else "gzip")
+INDEX_FILENAME = "index.sqlite3"
+
+_index: Optional[ConversationIndex] = None
+
 def ensure_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
     return DATA_DIR
 
+def get_shard_dir(user_id: str, session_id: str, create: bool = True) -> str:
+    digest = hashlib.sha256(f"{user_id}/{session_id}".encode("utf-8")).hexdigest()
+    shard_dir = os.path.join(DATA_DIR, digest[:2], digest[2:4])
+    if create and not os.path.exists(shard_dir):
+        os.makedirs(shard_dir, exist_ok=True)
+    return shard_dir
+
+def _document_extension() -> str:
+    compression = CONVERSATION_COMPRESSION
+    if compression == "zstd" and zstandard is None:
+        compression = "gzip"
+    return COMPRESSION_EXTENSIONS.get(compression, DOCUMENT_EXTENSION)
+
+# Path a compacted conversation is written to.
 def get_conversation_filepath(user_id: str, session_id: str) -> str:
-    ensure_data_dir()
-    return os.path.join(DATA_DIR, f"{user_id}_{session_id}.json")
+    return os.path.join(get_shard_dir(user_id, session_id), f"{user_id}_{session_id}{_document_extension()}")
 
-# Save a message to a conversation JSON file.
-def save_message(id: str, user_id: str, session_id: str, message: dict, agents: dict, run_mode_locally: bool, timestamp: str):
-    filepath = get_conversation_filepath(user_id, session_id)
-    if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            conversation = json.load(f)
+def get_conversation_logpath(user_id: str, session_id: str) -> str:
+    return os.path.join(get_shard_dir(user_id, session_id), f"{user_id}_{session_id}{LOG_EXTENSION}")
+
+# Writers (appends, compaction, delete) hold an exclusive lock on the
+# session's .lock file and readers a shared one, so several uvicorn workers
+# or replicas on a shared volume never interleave records, lose an append
+# to a concurrent compaction, or read a half-compacted session.
+# The lock file outlives the log, which is removed on compaction, and is
+# removed with the conversation. Reads of sessions that have no files
+# don't take the lock, so they never create one.
+def get_conversation_lockpath(user_id: str, session_id: str, create: bool = True) -> str:
+    return os.path.join(get_shard_dir(user_id, session_id, create=create), f"{user_id}_{session_id}.lock")
+
+@contextmanager
+def session_lock(user_id: str, session_id: str, shared: bool = False):
+    path = get_conversation_lockpath(user_id, session_id)
+    while True:
+        f = open(path, "a")
+        if fcntl is None:
+            break
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        # delete_conversation unlinks the lock file; lock the new one if this one is gone
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+def _session_files(directory: str, stem: str) -> List[str]:
+    logpath = os.path.join(directory, stem + LOG_EXTENSION)
+    return _existing_documents(directory, stem) + ([logpath] if os.path.exists(logpath) else [])
+
+# Metadata index used to list sessions without opening conversation bodies.
+# A fresh index is backfilled once from the files already on disk.
+def get_index() -> ConversationIndex:
+    global _index
+    path = os.path.join(ensure_data_dir(), INDEX_FILENAME)
+    if _index is None or _index.path != path:
+        _index = ConversationIndex(path)
+        if _index.created:
+            rebuild_index()
+    return _index
+
+def _read_document(path: str) -> dict:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        with open(path, "rb") as f:
+            return json.loads(zstandard.ZstdDecompressor().stream_reader(f).read())
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt") as f:
+            return json.load(f)
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _write_document(path: str, conversation: dict) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    if path.endswith(".zst"):
+        with open(tmp_path, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(json.dumps(conversation).encode("utf-8")))
+    elif path.endswith(".gz"):
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump(conversation, f)
+    else:
+        with open(tmp_path, "w") as f:
+            json.dump(conversation, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _existing_documents(directory: str, stem: str) -> List[str]:
+    return [path for path in (os.path.join(directory, stem + ext) for ext in DOCUMENT_EXTENSIONS) if os.path.exists(path)]
+
+def _header_record(id, user_id: str, session_id: str, agents, run_mode_locally, timestamp) -> dict:
+    return {
+        "record": "header",
+        "id": str(id) if id is not None else None,
+        "user_id": user_id,
+        "session_id": session_id,
+        "agents": agents,
+        "run_mode_locally": run_mode_locally,
+        "timestamp": timestamp
+    }
+
+def _read_log_header(logpath: str):
+    with open(logpath, "r") as f:
+        first_line = f.readline()
+    if not first_line.strip():
+        return None
+    record = json.loads(first_line)
+    return record if record.get("record") == "header" else None
+
+def _conversation_from_header(header: dict) -> dict:
+    return {
+        "id": header.get("id"),
+        "user_id": header.get("user_id"),
+        "session_id": header.get("session_id"),
+        "messages": [],
+        "agents": header.get("agents"),
+        "run_mode_locally": header.get("run_mode_locally"),
+        "timestamp": header.get("timestamp"),
+        "run_status": None
+    }
+
+# How hard an append is pushed to disk: not at all (left to the OS page
+# cache), once per appended batch, or after every single message.
+DURABILITY_NONE = "none"
+DURABILITY_FLUSH = "flush"
+DURABILITY_MESSAGE = "message"
+
+def _append_records(logpath: str, header: dict, messages: List[dict], durability: str = DURABILITY_NONE, records: List[dict] = ()):
+    lines = []
+    if os.path.exists(logpath) and os.path.getsize(logpath) > 0:
+        header = _read_log_header(logpath) or header
     else:
-        conversation = {
-            "id": str(id),
-            "user_id": user_id,
-            "session_id": session_id,
-            "messages": [],
-            "agents": agents,
-            "run_mode_locally": run_mode_locally,
-            "timestamp": timestamp
-        }
+        lines.append(json.dumps(header))
     # Append message with timestamp
     # message["id"] = str(uuid.uuid4())
     # message["timestamp"] = datetime.now().isoformat()
+    lines.extend(json.dumps({"record": "message", "message": message}) for message in messages)
+    lines.extend(json.dumps(record) for record in records)
+    with open(logpath, "a") as f:
+        if durability == DURABILITY_MESSAGE:
+            for line in lines:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            f.write("\n".join(lines) + "\n")
+            if durability == DURABILITY_FLUSH:
+                f.flush()
+                os.fsync(f.fileno())
+    return header
+
+# Save a message to a conversation by appending one line to its JSONL log.
+# Returns the conversation header with only the appended message; use
+# get_conversation() for the full history.
+def save_message(id: str, user_id: str, session_id: str, message: dict, agents: dict, run_mode_locally: bool, timestamp: str):
+    # Open (and, on first use, backfill) the index before this append lands
+    index = get_index()
+    with session_lock(user_id, session_id):
+        header = _append_records(
+            get_conversation_logpath(user_id, session_id),
+            _header_record(id, user_id, session_id, agents, run_mode_locally, timestamp),
+            [message]
+        )
+    index.record_messages(user_id, session_id, header.get("id"), header.get("timestamp"), [message])
+    conversation = _conversation_from_header(header)
     conversation["messages"].append(message)
-    with open(filepath, "w") as f:
-        json.dump(conversation, f, indent=2)
     return conversation
 
-# Retrieve a single conversation.
+# Append a batch of messages to a conversation log in a single write.
+def append_messages(user_id: str, session_id: str, messages: List[dict], durability: str = DURABILITY_NONE) -> int:
+    if not messages:
+        return 0
+    index = get_index()
+    with session_lock(user_id, session_id):
+        header = _append_records(
+            get_conversation_logpath(user_id, session_id),
+            _header_record(None, user_id, session_id, None, None, messages[0].get("time")),
+            messages,
+            durability
+        )
+    index.record_messages(user_id, session_id, header.get("id"), header.get("timestamp"), messages)
+    return len(messages)
+
+# Record where the session's team run stands ("running", "finished", "stopped"
+# or "failed"), so a reconnect never starts a finished run again.
+def set_run_status(user_id: str, session_id: str, status: str) -> bool:
+    stem = f"{user_id}_{session_id}"
+    shard_dir = get_shard_dir(user_id, session_id, create=False)
+    if not _session_files(shard_dir, stem):
+        return False
+    with session_lock(user_id, session_id):
+        # Deleted while waiting for the lock
+        if not _session_files(shard_dir, stem):
+            return False
+        logpath = get_conversation_logpath(user_id, session_id)
+        _append_records(logpath, _header_record(None, user_id, session_id, None, None, None), [],
+                        records=[{"record": "status", "run_status": status}])
+    return True
+
+def _replay_log(logpath: str, conversation=None):
+    with open(logpath, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from an interrupted write; everything
+                # before it is still valid.
+                print(f"Skipping unreadable record in {logpath}")
+                continue
+            if record.get("record") == "header":
+                if conversation is None:
+                    conversation = _conversation_from_header(record)
+            elif record.get("record") == "message" and conversation is not None:
+                conversation["messages"].append(record["message"])
+            elif record.get("record") == "status" and conversation is not None:
+                conversation["run_status"] = record["run_status"]
+    return conversation
+
+def _load_location(directory: str, stem: str):
+    conversation = None
+    documents = _existing_documents(directory, stem)
+    if documents:
+        conversation = _read_document(documents[0])
+    logpath = os.path.join(directory, stem + LOG_EXTENSION)
+    if os.path.exists(logpath):
+        conversation = _replay_log(logpath, conversation)
+    return conversation
+
+def _get_conversation_unlocked(user_id: str, session_id: str):
+    stem = f"{user_id}_{session_id}"
+    conversation = _load_location(get_shard_dir(user_id, session_id, create=False), stem)
+    if conversation is None and os.path.exists(DATA_DIR):
+        conversation = _load_location(DATA_DIR, stem)
+    return conversation
+
+# Retrieve a single conversation, rebuilt from the compacted document and
+# any messages logged since. Falls back to the pre-sharding flat layout.
 def get_conversation(user_id: str, session_id: str):
-    filepath = get_conversation_filepath(user_id, session_id)
-    if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            return json.load(f)
-    return None
+    stem = f"{user_id}_{session_id}"
+    if not _session_files(get_shard_dir(user_id, session_id, create=False), stem):
+        return _load_location(DATA_DIR, stem) if os.path.exists(DATA_DIR) else None
+    with session_lock(user_id, session_id, shared=True):
+        return _get_conversation_unlocked(user_id, session_id)
+
+# Fold the JSONL log into the consolidated, compressed conversation document.
+# The new document is renamed into place before the log is removed, and both
+# happen under the session lock, so no append or reader sees a gap.
+def compact_conversation(user_id: str, session_id: str):
+    if not _session_files(get_shard_dir(user_id, session_id, create=False), f"{user_id}_{session_id}"):
+        return get_conversation(user_id, session_id)
+    with session_lock(user_id, session_id):
+        logpath = get_conversation_logpath(user_id, session_id)
+        conversation = _get_conversation_unlocked(user_id, session_id)
+        if conversation is None or not os.path.exists(logpath):
+            return conversation
+        filepath = get_conversation_filepath(user_id, session_id)
+        _write_document(filepath, conversation)
+        for stale in _existing_documents(os.path.dirname(filepath), f"{user_id}_{session_id}"):
+            if stale != filepath:
+                os.remove(stale)
+        os.remove(logpath)
+        return conversation
 
 def extract_session_id(filepath: str) -> str:
     filename = os.path.basename(filepath)
-    session_id = filename.split('_', 1)[-1].rsplit('.', 1)[0]
+    # Strip only the known suffixes (.json, .jsonl, .json.gz, .json.zst); session ids may contain dots
+    stem = _stem_of(filename) or filename.rsplit('.', 1)[0]
+    session_id = stem.split('_', 1)[-1]
     return session_id
 
-# List all conversations.
-def get_all_conversations() -> List[dict]:
+def _stem_of(fname: str) -> Optional[str]:
+    for extension in DOCUMENT_EXTENSIONS + (LOG_EXTENSION,):
+        if fname.endswith(extension):
+            return fname[:-len(extension)]
+    return None
+
+# Every (directory, stem) that holds a conversation, sharded or flat.
+def _conversation_locations() -> Iterator[Tuple[str, str]]:
     ensure_data_dir()
-    conversations = []
-    for fname in os.listdir(DATA_DIR):
-        if fname.endswith(".json"):
-            path = os.path.join(DATA_DIR, fname)
-            try:
-                with open(path, "r") as f:
-                    conversations.append(json.load(f))
-            except json.JSONDecodeError:
-                print(f"Error decoding JSON from file {path}")
-                conversations.append({
-                        "id": "DUMMY-b666-4943-9c3d-ec9482751601",
-                        "user_id": "user123",
-                        "session_id": extract_session_id(path),
-                        "messages": [],
-                        "agents": [],
-                        "run_mode_locally": "false",
-                        "timestamp": "ERROR"
-
-                    })
-    return conversations
+    for directory, _, filenames in os.walk(DATA_DIR):
+        stems = {stem for stem in map(_stem_of, filenames) if stem is not None}
+        for stem in sorted(stems):
+            yield directory, stem
+
+# Rebuild the metadata index from the conversation files on disk.
+def rebuild_index() -> int:
+    index = get_index()
+    index.clear()
+    indexed = 0
+    for directory, stem in _conversation_locations():
+        try:
+            conversation = _load_location(directory, stem)
+        except (json.JSONDecodeError, ValueError, OSError):
+            print(f"Error decoding conversation {os.path.join(directory, stem)}")
+            continue
+        if conversation is not None:
+            index.put(conversation)
+            indexed += 1
+    return indexed
+
+# Move conversations from the flat layout into shards, compressing
+# compacted documents on the way.
+def migrate_layout() -> int:
+    migrated = 0
+    for fname in sorted(os.listdir(ensure_data_dir())):
+        path = os.path.join(DATA_DIR, fname)
+        stem = _stem_of(fname)
+        if stem is None or not os.path.isfile(path):
+            continue
+        try:
+            conversation = _load_location(DATA_DIR, stem) if fname.endswith(LOG_EXTENSION) else _read_document(path)
+        except (json.JSONDecodeError, ValueError, OSError):
+            print(f"Skipping unreadable conversation {path}")
+            continue
+        if conversation is None:
+            continue
+        user_id, session_id = conversation["user_id"], conversation["session_id"]
+        if fname.endswith(LOG_EXTENSION):
+            target = get_conversation_logpath(user_id, session_id)
+            if os.path.exists(target):
+                print(f"Skipping {path}: {target} already exists")
+                continue
+            shutil.move(path, target)
+        else:
+            target = get_conversation_filepath(user_id, session_id)
+            if not os.path.exists(target):
+                _write_document(target, conversation)
+            os.remove(path)
+        migrated += 1
+    rebuild_index()
+    print(f"Migrated {migrated} files into the sharded layout under {DATA_DIR}.")
+    return migrated
+
+# Page through conversation summaries (id, user_id, session_id, timestamp,
+# updated_at, message_count, preview) straight from the metadata index.
+def list_conversations(user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> dict:
+    return get_index().list(user_id=user_id, page=page, page_size=page_size)
+
+# List all conversations.
+def get_all_conversations(page: int = 1, page_size: int = 20) -> List[dict]:
+    return list_conversations(page=page, page_size=page_size)["conversations"]
 
 # List conversations for a particular user.
-def get_user_conversations(user_id: str):
-    ensure_data_dir()
-    conversations = []
-    for fname in os.listdir(DATA_DIR):
-        if fname.startswith(user_id+"_") and fname.endswith(".json"):
-            path = os.path.join(DATA_DIR, fname)
-            with open(path, "r") as f:
-                conversations.append(json.load(f))
-    return conversations
+def get_user_conversations(user_id: str, page: int = 1, page_size: int = 20):
+    return list_conversations(user_id=user_id, page=page, page_size=page_size)["conversations"]
+
+def _delete_files(user_id: str, session_id: str) -> bool:
+    deleted = False
+    stem = f"{user_id}_{session_id}"
+    for directory in (get_shard_dir(user_id, session_id, create=False), DATA_DIR):
+        for path in _session_files(directory, stem):
+            os.remove(path)
+            deleted = True
+    return deleted
 
 def delete_conversation(user_id: str, session_id: str) -> bool:
-    filepath = get_conversation_filepath(user_id, session_id)
-    if os.path.exists(filepath):
-        os.remove(filepath)
-        return True
-    return False
\ No newline at end of file
+    lockpath = get_conversation_lockpath(user_id, session_id, create=False)
+    if not os.path.exists(lockpath) and not _session_files(os.path.dirname(lockpath), f"{user_id}_{session_id}"):
+        # Nothing in the shard: at most a pre-sharding flat file, which no writer locks
+        deleted = _delete_files(user_id, session_id)
+    else:
+        with session_lock(user_id, session_id):
+            deleted = _delete_files(user_id, session_id)
+            # Removed while still held; anyone waiting on it re-opens a fresh lock file
+            os.remove(lockpath)
+    get_index().remove(user_id, session_id)
+    return deleted
+
+def get_current_time():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _stress_writer(data_dir: str, user_id: str, session_id: str, worker: int, messages: int, compact_every: int) -> None:
+    global DATA_DIR, _index
+    DATA_DIR, _index = data_dir, None
+    for i in range(messages):
+        append_messages(user_id, session_id, [{"time": get_current_time(), "worker": worker, "seq": i, "content": f"{worker}:{i}"}])
+        if compact_every and (i + 1) % compact_every == 0:
+            compact_conversation(user_id, session_id)
+
+# Several processes append to (and compact) one session at the same time;
+# every message must come back exactly once.
+def stress_test(processes: int = 8, messages: int = 250, compact_every: int = 50) -> bool:
+    import multiprocessing
+    user_id, session_id = "stress", f"stress-{uuid.uuid4().hex[:8]}"
+    save_message(id=uuid.uuid4(), user_id=user_id, session_id=session_id, message={"content": "task"},
+                 agents=[], run_mode_locally=False, timestamp=get_current_time())
+    workers = [
+        multiprocessing.Process(target=_stress_writer, args=(DATA_DIR, user_id, session_id, worker, messages, compact_every))
+        for worker in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    conversation = compact_conversation(user_id, session_id)
+    seen = [(m["worker"], m["seq"]) for m in conversation["messages"] if "worker" in m]
+    expected = {(worker, i) for worker in range(processes) for i in range(messages)}
+    missing, duplicates = expected - set(seen), len(seen) - len(set(seen))
+    indexed = get_index().get(user_id, session_id)["message_count"]
+    print(f"{processes} writers x {messages} messages: kept {len(set(seen))}/{len(expected)}, "
+          f"missing {len(missing)}, duplicated {duplicates}, indexed {indexed - 1}")
+    delete_conversation(user_id, session_id)
+    return not missing and not duplicates and indexed - 1 == len(expected)
+
+if __name__ == "__main__":
+    import argparse, sys
+    parser = argparse.ArgumentParser(description="File conversation store tools.")
+    parser.add_argument("command", choices=["migrate-layout", "rebuild-index", "stress"])
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Conversations directory")
+    parser.add_argument("--processes", type=int, default=8, help="Writer processes for the stress test")
+    parser.add_argument("--messages", type=int, default=250, help="Messages per writer for the stress test")
+
+    # python crud.py migrate-layout --data-dir ./data/conversations
+    # python crud.py stress --processes 8 --messages 250
+    args = parser.parse_args()
+    DATA_DIR = args.data_dir
+    if args.command == "migrate-layout":
+        migrate_layout()
+    elif args.command == "rebuild-index":
+        print(f"Indexed {rebuild_index()} conversations.")
+    else:
+        sys.exit(0 if stress_test(args.processes, args.messages) else 1)
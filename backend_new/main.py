@@ -1,26 +1,37 @@
 # File: main.py
-from fastapi import FastAPI, Depends, UploadFile, HTTPException, Query, File, Form
+from fastapi import FastAPI, Depends, UploadFile, HTTPException, Query, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobServiceClient
-import schemas, crud
+import schemas
+from message_buffer import MessageBuffer
+from conversation_store import create_conversation_store
+import persistence
+from persistence import run_blocking
+from artifact_store import get_artifact_store, externalize_data_uri, parse_range, sniff_content_type, HASH_PATTERN
 from database import CosmosDB
+from team_catalog import TeamCatalog, etag_matches
+from session_registry import SessionRegistry
+from admission import AdmissionController, AdmissionRejected
+import model_clients
+from cosmos_metrics import metrics as cosmos_metrics, current_endpoint
+from starlette.routing import Match
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError
 import os
 import uuid
 from contextlib import asynccontextmanager
 from fastapi.responses import StreamingResponse, Response
 import json, asyncio
-from agent_framework_helper import AgentFrameworkHelper, generate_session_name
+from agent_framework_helper import AgentFrameworkHelper, generate_session_name, is_persisted_event, expand_agent_deltas
 import logging
 from datetime import datetime 
 from schemas import AutoGenMessage
-from typing import List
+from typing import List, Optional
 import time
 
 print("Starting the Agent Framework server...")
 
-session_data = {}
 AGENT_FRAMEWORK_DEFAULT_AGENTS = [
     {
         "input_key":"0001",
@@ -53,11 +64,30 @@ AGENT_FRAMEWORK_DEFAULT_AGENTS = [
 async def lifespan(app: FastAPI):
     # Startup code: initialize database and configure logging
     app.state.db = CosmosDB()
+    app.state.store = create_conversation_store(app.state.db)
+    app.state.teams = TeamCatalog(app.state.db)
+    app.state.sessions = SessionRegistry().start()
+    app.state.admission = AdmissionController()
+    # Azure OpenAI clients and credential shared by every session
+    app.state.model_clients = model_clients.registry
     logging.basicConfig(level=logging.WARNING,
                         format='%(levelname)s: %(asctime)s - %(message)s')
+    # CosmosDB() makes no network calls; build the client in the background so
+    # replicas accept traffic without waiting on Cosmos
+    warm_up = asyncio.ensure_future(run_blocking(app.state.db.warm_up))
+    warm_up.add_done_callback(
+        lambda task: task.cancelled() or task.exception() is None
+        or logging.getLogger("lifespan").warning(f"Cosmos warm-up failed: {task.exception()}")
+    )
     print("Database initialized.")
     yield
     # Shutdown code
+    # Cancel runs still in flight and release their executors and clients
+    await app.state.sessions.close()
+    await app.state.model_clients.close()
+    app.state.store = None
+    app.state.teams = None
+    persistence.shutdown()
     app.state.db = None
 
 app = FastAPI(lifespan=lifespan)
@@ -71,6 +101,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def tag_cosmos_endpoint(request: Request, call_next):
+    # Label Cosmos metrics with the route template, not the raw path
+    endpoint = request.url.path
+    for route in app.router.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            endpoint = f"{request.method} {route.path}"
+            break
+    token = current_endpoint.set(endpoint)
+    try:
+        return await call_next(request)
+    finally:
+        current_endpoint.reset(token)
+
 # Azure AD Authentication (Mocked for example)
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
     authorizationUrl="https://login.microsoftonline.com/common/oauth2/v2.0/authorize",
@@ -100,7 +144,7 @@ def get_agent_icon(agent_name) -> str:
         agent_icon = "🤖"
     return agent_icon
 
-async def display_log_message(streaming_event, logs_dir, session_id, user_id, conversation=None):
+async def display_log_message(streaming_event, logs_dir, session_id, user_id, conversation=None, message_buffer=None):
     """Convert Agent Framework StreamingEvent to AutoGenMessage format"""
     _user_id = user_id
     
@@ -114,18 +158,27 @@ async def display_log_message(streaming_event, logs_dir, session_id, user_id, co
     _response.source = streaming_event.source
     _response.content = streaming_event.content
     _response.stop_reason = streaming_event.stop_reason
-    _response.content_image = streaming_event.content_image
-
-    # Save to database
-    _ = crud.save_message(
-        id=None,  # auto-generated
-        user_id=_user_id,
-        session_id=session_id,
-        message=_response.to_json(),
-        agents=None,
-        run_mode_locally=None,
-        timestamp=_response.time
-    )
+    # Keep images out of messages and SSE frames; they carry an artifact reference instead
+    if streaming_event.content_image:
+        _response.content_image = await run_blocking(externalize_data_uri, streaming_event.content_image)
+
+    # Save to database; token deltas are streamed only, the consolidated
+    # agent_message that follows them is what gets stored
+    if not is_persisted_event(streaming_event.event_type):
+        return _response
+    if message_buffer is not None:
+        # Written behind the stream in batches
+        message_buffer.add(_response.to_json())
+    else:
+        _ = await app.state.store.save_message(
+            id=None,  # auto-generated
+            user_id=_user_id,
+            session_id=session_id,
+            message=_response.to_json(),
+            agents=None,
+            run_mode_locally=None,
+            timestamp=_response.time
+        )
 
     return _response
 
@@ -144,10 +197,14 @@ async def chat_endpoint(
 ):
     mock_response = "This is a mock AI response using Agent Framework (Markdown formatted)."
     # Log the user message.
-    crud.save_message(
+    await app.state.store.save_message(
+        id=uuid.uuid4(),
         user_id=user["sub"],
         session_id="session_direct",
-        message={"content": message.content, "role": "user"}
+        message={"content": message.content, "role": "user"},
+        agents=None,
+        run_mode_locally=False,
+        timestamp=get_current_time()
     )
     # Log the AI response message.
     response = {
@@ -159,10 +216,14 @@ async def chat_endpoint(
         "models_usage": None,
         "content_image": None,
     }
-    crud.save_message(
+    await app.state.store.save_message(
+        id=None,
         user_id=user["sub"],
         session_id="session_direct",
-        message=response
+        message=response,
+        agents=None,
+        run_mode_locally=None,
+        timestamp=response["time"]
     )
 
     return Response(content=json.dumps(response), media_type="application/json")
@@ -182,7 +243,7 @@ async def start_agent_session(
     _agents = json.loads(message.agents) if message.agents else AGENT_FRAMEWORK_DEFAULT_AGENTS
     _session_id = generate_session_name()
     
-    conversation = crud.save_message(
+    conversation = await app.state.store.save_message(
         id=uuid.uuid4(),
         user_id=_user_id,
         session_id=_session_id,
@@ -205,9 +266,64 @@ async def start_agent_session(
     )
     return db_message
 
+def parse_last_event_id(value) -> int:
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_seq(value, name: str) -> Optional[int]:
+    """A message sequence number from a request body, None when absent; 400 unless a non-negative integer."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(value)
+        seq = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{name} must be a non-negative integer")
+    if seq < 0:
+        raise HTTPException(status_code=400, detail=f"{name} must be a non-negative integer")
+    return seq
+
+
+async def stored_events(conversation, last_event_id: int = 0):
+    # Message 0 is the task; the rest are the persisted events of the run
+    for seq, message in enumerate(conversation["messages"]):
+        if seq > last_event_id:
+            yield None, seq, json.dumps(message)
+
+
+async def sse_events(events):
+    async for event, event_id, data in events:
+        if event == "queue":
+            # Queue position while waiting for admission; no id, so Last-Event-ID is unaffected
+            yield f"event: queue\ndata: {json.dumps(data)}\n\n"
+        elif event_id is None:
+            # Stream-only events (token deltas) aren't stored, so they get no resumable id
+            yield f"data: {data}\n\n"
+        else:
+            yield f"id: {event_id}\ndata: {data}\n\n"
+    # Tells EventSource the run is over, so it closes instead of reconnecting
+    yield "event: end\ndata: end\n\n"
+
+
+def subscribe_run(session_id: str, user_id: str, last_event_id: int = 0):
+    async def backfill(start_seq: int, end_seq: int):
+        # Persisted events the run's buffer has already dropped come from the store
+        conversation = await app.state.store.get_conversation(user_id, session_id, start_seq, end_seq)
+        for offset, message in enumerate(conversation["messages"] if conversation is not None else []):
+            yield start_seq + offset, json.dumps(message)
+
+    ticket = app.state.admission.waiting(session_id)
+    return app.state.sessions.subscribe(session_id, last_event_id, ticket.watch() if ticket is not None else None, backfill)
+
+
 # Streaming Chat Endpoint using Agent Framework
 @app.get("/chat-stream")
 async def agent_chat_stream(
+    request: Request,
     session_id: str = Query(...),
     user_id: str = Query(...),
     user: dict = Depends(validate_token)
@@ -221,9 +337,31 @@ async def agent_chat_stream(
     if not os.path.exists(logs_dir):    
         os.makedirs(logs_dir)
 
+    # EventSource sends Last-Event-ID when it reconnects; plain clients may pass it as a query parameter
+    last_event_id = parse_last_event_id(request.headers.get("last-event-id") or request.query_params.get("last_event_id"))
+    sessions = app.state.sessions
+
+    # Claim the session before the first await so concurrent requests share one run, and
+    # attach to a run that is in progress (or finished recently) instead of starting the team again
+    run, created = sessions.claim(session_id, user_id)
+    if not created:
+        logger.info(f"Attaching to run {session_id} after event {last_event_id}")
+        return StreamingResponse(sse_events(subscribe_run(session_id, user_id, last_event_id)), media_type="text/event-stream")
+
     # Get the conversation from the database using user and session id
-    conversation = crud.get_conversation(user_id, session_id)
+    try:
+        conversation = await app.state.store.get_conversation(user_id, session_id)
+    except BaseException:
+        sessions.discard(run)
+        raise
     logger.info(f"Conversation retrieved: {conversation}")
+    if conversation is None:
+        sessions.discard(run)
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation.get("run_status") or len(conversation["messages"]) > 1:
+        sessions.discard(run)
+        # The run already happened; replay what was stored instead of running the team again
+        return StreamingResponse(sse_events(stored_events(conversation, last_event_id)), media_type="text/event-stream")
     
     # Get first message from the conversation
     first_message = conversation["messages"][0]
@@ -234,47 +372,152 @@ async def agent_chat_stream(
     _run_locally = conversation["run_mode_locally"]
     _agents = conversation["agents"]
 
-    # Initialize the Agent Framework system with user_id
-    agent_helper = AgentFrameworkHelper(
-        logs_dir=logs_dir, 
-        save_screenshots=False, 
-        run_locally=_run_locally, 
-        user_id=user_id
-    )
-    logger.info(f"Initializing Agent Framework with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
-    await agent_helper.initialize(agents=_agents, session_id=session_id)
-    logger.info(f"Initialized Agent Framework with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
-
-    stream, cancellation_token = agent_helper.main(task=task)
-    logger.info(f"Stream and cancellation token created for task: {task}")
-
-    async def event_generator(stream, conversation):
-        async for streaming_event in stream:
-            json_response = await display_log_message(
-                streaming_event=streaming_event, 
+    # Start now, wait in the queue for a free slot, or turn the request away
+    try:
+        ticket = app.state.admission.try_enter(session_id, user_id)
+    except AdmissionRejected as e:
+        logger.warning(f"Session {session_id} rejected: {e.reason}")
+        sessions.discard(run)
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    # The idle timeout only starts once the run leaves the queue
+    run.queued = not ticket.admitted
+
+
+    # The team runs in the background, independent of any one SSE connection
+    async def run_team(conversation):
+        message_buffer = None
+        run_status = "failed"
+        try:
+            await ticket.wait()
+            run.queued = False
+            run.last_activity = time.time()
+            await app.state.store.set_run_status(user_id, session_id, "running")
+
+            # Initialize the Agent Framework system with user_id
+            agent_helper = AgentFrameworkHelper(
                 logs_dir=logs_dir, 
-                session_id=agent_helper.session_id, 
-                conversation=conversation, 
-                user_id=user_id
-            )    
-            yield f"data: {json.dumps(json_response.to_json())}\n\n"
-
-    return StreamingResponse(event_generator(stream, conversation), media_type="text/event-stream")
+                save_screenshots=False, 
+                run_locally=_run_locally, 
+                user_id=user_id,
+                model_clients_registry=app.state.model_clients
+            )
+            run.resources.append(agent_helper)
+            logger.info(f"Initializing Agent Framework with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
+            await agent_helper.initialize(agents=_agents, session_id=session_id)
+            logger.info(f"Initialized Agent Framework with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
+
+            stream, run.cancellation_token = agent_helper.main(task=task)
+            logger.info(f"Stream and cancellation token created for task: {task}")
+            message_buffer = MessageBuffer(user_id, session_id, store=app.state.store).start()
+            async for streaming_event in stream:
+                json_response = await display_log_message(
+                    streaming_event=streaming_event, 
+                    logs_dir=logs_dir, 
+                    session_id=session_id, 
+                    conversation=conversation, 
+                    user_id=user_id,
+                    message_buffer=message_buffer
+                )    
+                sessions.publish(run, json.dumps(json_response.to_json()), persisted=is_persisted_event(json_response.type))
+            run_status = "finished"
+        except asyncio.CancelledError:
+            # Without a cancellation token /stop cancels this task; end the run cleanly
+            if not sessions.was_stopped(run):
+                raise
+        except Exception as e:
+            logger.error(f"Run {session_id} failed: {str(e)}")
+        finally:
+            if sessions.was_stopped(run):
+                run_status = "stopped"
+            if message_buffer is not None:
+                await message_buffer.close()
+            try:
+                # Marks the run as done, so a later reconnect replays it instead of starting it again
+                await app.state.store.set_run_status(user_id, session_id, run_status)
+            except Exception as e:
+                logger.error(f"Could not record run status for {session_id}: {str(e)}")
+            if message_buffer is not None:
+                # Finalize the stored conversation (compacts the file store's message log)
+                await app.state.store.compact_conversation(user_id, session_id)
+            await sessions.finish(run)
+            # Free the slot only once the run's clients and tools are closed
+            app.state.admission.release(ticket)
+
+    sessions.attach_task(run, asyncio.create_task(run_team(conversation)))
+
+    return StreamingResponse(sse_events(subscribe_run(session_id, user_id, last_event_id)), media_type="text/event-stream")
+
+# Replay a stored conversation over SSE, optionally with the delta view rebuilt
+@app.get("/chat-replay")
+async def agent_chat_replay(
+    session_id: str = Query(...),
+    user_id: str = Query(...),
+    deltas: bool = Query(False),
+    user: dict = Depends(validate_token)
+):
+    conversation = await app.state.store.get_conversation(user_id, session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    # The first message is the user's task, not a streamed event
+    messages = conversation["messages"][1:]
+
+    async def replay_generator():
+        for message in (expand_agent_deltas(messages) if deltas else messages):
+            yield f"data: {json.dumps(message)}\n\n"
+
+    return StreamingResponse(replay_generator(), media_type="text/event-stream")
+
+# Serve content-addressed artifacts (screenshots, plots) referenced by messages
+@app.get("/artifacts/{artifact_hash}")
+async def get_artifact(artifact_hash: str, request: Request):
+    if not HASH_PATTERN.match(artifact_hash):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    etag = f'"{artifact_hash}"'
+    headers = {
+        "ETag": etag,
+        # The URL is derived from the content, so it never changes
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    data = await run_blocking(get_artifact_store().get, artifact_hash)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    media_type = sniff_content_type(data)
+    try:
+        byte_range = parse_range(request.headers.get("range"), len(data))
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
 
 @app.get("/stop")
 async def stop(session_id: str = Query(...)):
     try:
         print("Stopping session:", session_id)
-        cancellation_token = session_data[session_id].get("cancellation_token")
-        if cancellation_token:
-            cancellation_token.cancel()
+        if await app.state.sessions.stop(session_id, "stopped by user"):
             return {"status": "success", "message": f"Session {session_id} cancelled successfully."}
         else:
-            return {"status": "error", "message": "Cancellation token not found."}
+            return {"status": "error", "message": f"Session {session_id} is not running."}
     except Exception as e:
         print(f"Error stopping session {session_id}: {str(e)}")
         return {"status": "error", "message": f"Error stopping session: {str(e)}"}
 
+# Runs currently registered, optionally for one user
+@app.get("/sessions/running")
+async def running_sessions(user_id: str = Query(None)):
+    return app.state.sessions.list(user_id)
+
+# Admission control: running and waiting sessions against the configured limits
+@app.get("/sessions/admission")
+async def admission_status():
+    return app.state.admission.stats()
+
 # Conversations endpoints (unchanged)
 @app.post("/conversations")
 async def list_all_conversations(
@@ -285,10 +528,12 @@ async def list_all_conversations(
         user_id = request_data.get("user_id")
         page = request_data.get("page", 1)
         page_size = request_data.get("page_size", 20)
-        conversations = app.state.db.fetch_user_conversatons(
-            user_id=None, 
+        continuation_token = request_data.get("continuation_token")
+        conversations = await app.state.store.list_conversations(
+            user_id=user_id, 
             page=page, 
-            page_size=page_size
+            page_size=page_size,
+            continuation_token=continuation_token
         )
         return conversations
     except Exception as e:
@@ -299,8 +544,13 @@ async def list_all_conversations(
 async def list_user_conversation(request_data: dict = None, user: dict = Depends(validate_token)):
     session_id = request_data.get("session_id") if request_data else None
     user_id = request_data.get("user_id") if request_data else None
-    conversations = app.state.db.fetch_user_conversation(user_id, session_id=session_id)
-    return conversations
+    # Optional message range by sequence number: [start_seq, end_seq)
+    start_seq = parse_seq(request_data.get("start_seq"), "start_seq") if request_data else None
+    end_seq = parse_seq(request_data.get("end_seq"), "end_seq") if request_data else None
+    if start_seq is not None and end_seq is not None and end_seq <= start_seq:
+        raise HTTPException(status_code=400, detail="end_seq must be greater than start_seq")
+    conversation = await app.state.store.get_conversation(user_id, session_id, start_seq or 0, end_seq)
+    return [conversation] if conversation else []
 
 @app.post("/conversations/delete")
 async def delete_conversation(session_id: str = Query(...), user_id: str = Query(...), user: dict = Depends(validate_token)):
@@ -308,7 +558,7 @@ async def delete_conversation(session_id: str = Query(...), user_id: str = Query
     logger.setLevel(logging.INFO)
     logger.info(f"Deleting conversation with session_id: {session_id} for user_id: {user_id}")
     try:
-        result = app.state.db.delete_user_conversation(user_id=user_id, session_id=session_id)
+        result = await app.state.store.delete_conversation(user_id=user_id, session_id=session_id)
         if result:
             logger.info(f"Conversation {session_id} deleted successfully.")
             return {"status": "success", "message": f"Conversation {session_id} deleted successfully."}
@@ -319,6 +569,11 @@ async def delete_conversation(session_id: str = Query(...), user_id: str = Query
         logger.error(f"Error deleting conversation {session_id}: {str(e)}")
         return {"status": "error", "message": f"Error deleting conversation: {str(e)}"}
     
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Cosmos RU, latency and item-count histograms per operation and endpoint (Prometheus text format)
+    return Response(content=cosmos_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     logger = logging.getLogger("health_check")
@@ -327,29 +582,45 @@ async def health_check():
     return {"status": "healthy", "framework": "Microsoft Agent Framework"}
 
 # Teams endpoints (unchanged)
+def catalog_response(request: Request, content, etag: str) -> Response:
+    # Clients revalidate every time; unchanged catalogs cost a 304 and no body
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=json.dumps(content, default=str), media_type="application/json", headers=headers)
+
 @app.get("/teams")
-async def get_teams_api():
+async def get_teams_api(request: Request):
     try:
-        teams = app.state.db.get_teams()
-        return teams
+        teams, etag = await run_blocking(app.state.teams.list_teams)
+        return catalog_response(request, teams, etag)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving teams: {str(e)}")
+
+@app.get("/teams/summary")
+async def get_team_summaries_api(request: Request):
+    try:
+        summaries, etag = await run_blocking(app.state.teams.list_summaries)
+        return catalog_response(request, summaries, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving teams: {str(e)}")
 
 @app.get("/teams/{team_id}")
-async def get_team_api(team_id: str):
+async def get_team_api(team_id: str, request: Request):
     try:
-        team = app.state.db.get_team(team_id)
-        if not team:
-            raise HTTPException(status_code=404, detail="Team not found")
-        return team
+        team, etag = await run_blocking(app.state.teams.get_team, team_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving team: {str(e)}")
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    return catalog_response(request, team, etag)
 
 @app.post("/teams")
 async def create_team_api(team: dict):
     try:
         team["agents"] = AGENT_FRAMEWORK_DEFAULT_AGENTS
-        response = app.state.db.create_team(team)
+        response = await run_blocking(app.state.db.create_team, team)
+        app.state.teams.invalidate()
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating team: {str(e)}")
@@ -359,7 +630,8 @@ async def update_team_api(team_id: str, team: dict):
     logger = logging.getLogger("update_team_api")
     logger.info(f"Updating team with ID: {team_id} and data: {team}")
     try:
-        response = app.state.db.update_team(team_id, team)
+        response = await run_blocking(app.state.db.update_team, team_id, team)
+        app.state.teams.invalidate()
         if "error" in response:
             logger.error(f"Error updating team: {response['error']}")
             raise HTTPException(status_code=404, detail=response["error"])
@@ -368,10 +640,38 @@ async def update_team_api(team_id: str, team: dict):
         logger.error(f"Error updating team: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating team: {str(e)}")
 
+@app.patch("/teams/{team_id}")
+async def patch_team_api(team_id: str, request: Request):
+    # Body: a list of {"op", "path", "value"} patch operations, or a dict of fields to set.
+    # Send the team's ETag as If-Match to reject the edit if someone changed it first.
+    logger = logging.getLogger("patch_team_api")
+    if_match = request.headers.get("if-match")
+    try:
+        operations = await request.json()
+        team, _ = await run_blocking(app.state.teams.get_team, team_id)
+        response = await run_blocking(
+            app.state.db.patch_team, team_id, operations, if_match, team["id"] if team else None
+        )
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Patch body must be JSON")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CosmosAccessConditionFailedError:
+        raise HTTPException(status_code=412, detail="Team was modified since the given ETag")
+    except Exception as e:
+        logger.error(f"Error patching team: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error patching team: {str(e)}")
+    if "error" in response:
+        raise HTTPException(status_code=404, detail=response["error"])
+    app.state.teams.invalidate()
+    return Response(content=json.dumps(response, default=str), media_type="application/json",
+                    headers={"ETag": response.get("_etag", "")})
+
 @app.delete("/teams/{team_id}")
 async def delete_team_api(team_id: str):
     try:
-        response = app.state.db.delete_team(team_id)
+        response = await run_blocking(app.state.db.delete_team, team_id)
+        app.state.teams.invalidate()
         if "error" in response:
             raise HTTPException(status_code=404, detail=response["error"])
         return response
@@ -381,7 +681,8 @@ async def delete_team_api(team_id: str):
 @app.post("/inititalize-teams")
 async def initialize_teams_api():
     try:
-        msg = app.state.db.initialize_teams()
+        msg = await run_blocking(app.state.db.initialize_teams)
+        app.state.teams.invalidate()
         msg = "Teams initialized successfully with Agent Framework."
         return {"status": "success", "message": msg}
     except Exception as e:
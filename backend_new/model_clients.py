@@ -0,0 +1,84 @@
+# File: model_clients.py
+import inspect
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from agent_framework.azure import AzureOpenAIChatClient
+from azure.identity import DefaultAzureCredential
+
+# Default deployment used by the teams
+AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
+# None lets the SDK pick its default API version
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
+
+_logger = logging.getLogger("model_clients")
+
+
+class ModelClientRegistry:
+    def __init__(self, endpoint: Optional[str] = None, api_version: Optional[str] = None) -> None:
+        """
+        Process-wide Azure OpenAI chat clients shared by all sessions.
+
+        Each distinct (deployment, api version) gets one AzureOpenAIChatClient,
+        created on first use, so sessions reuse its keep-alive connection
+        pool instead of opening new connections and TLS handshakes per run.
+        All clients share one DefaultAzureCredential, so AAD tokens are
+        cached across sessions too. close() is called from the FastAPI lifespan.
+
+        Args:
+            endpoint: Azure OpenAI endpoint (AZURE_OPENAI_ENDPOINT by default)
+            api_version: API version used when a caller doesn't pass one
+        """
+        self.endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.api_version = api_version or AZURE_OPENAI_API_VERSION
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple, AzureOpenAIChatClient] = {}
+        self._credential = None
+
+    @property
+    def credential(self):
+        with self._lock:
+            if self._credential is None:
+                self._credential = DefaultAzureCredential()
+            return self._credential
+
+    def get(self, deployment: Optional[str] = None, api_version: Optional[str] = None) -> AzureOpenAIChatClient:
+        """Shared chat client for a deployment (AZURE_OPENAI_DEPLOYMENT by default)."""
+        deployment = deployment or AZURE_OPENAI_DEPLOYMENT
+        api_version = api_version or self.api_version
+        key = (deployment, api_version)
+        credential = self.credential
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                options = {"api_version": api_version} if api_version else {}
+                client = self._clients[key] = AzureOpenAIChatClient(
+                    model_id=deployment,
+                    endpoint=self.endpoint,
+                    credential=credential,
+                    **options,
+                )
+                _logger.info(f"Created chat client for {deployment} ({api_version or 'default api version'})")
+            return client
+
+    async def close(self) -> None:
+        """Close every pooled client and the credential. The registry can be used again afterwards."""
+        with self._lock:
+            clients = list(self._clients.values())
+            credential = self._credential
+            self._clients = {}
+            self._credential = None
+        # Chat clients keep their connection pool on the underlying OpenAI client
+        resources = [c if hasattr(c, "close") else getattr(c, "client", None) for c in clients]
+        for resource in [r for r in resources if r is not None] + ([credential] if credential is not None else []):
+            try:
+                result = resource.close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                _logger.error(f"Error closing {type(resource).__name__}: {str(e)}")
+
+
+registry = ModelClientRegistry()
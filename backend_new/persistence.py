@@ -0,0 +1,102 @@
+# File: persistence.py
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Upper bound on threads doing blocking file/SQLite/Cosmos calls. Keeping it
+# separate from the default executor means a slow disk or Cosmos throttling
+# queues persistence work instead of starving other to_thread users.
+PERSISTENCE_MAX_WORKERS = int(os.getenv("PERSISTENCE_MAX_WORKERS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PERSISTENCE_MAX_WORKERS, thread_name_prefix="persistence")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking persistence call on the bounded pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the calling endpoint for Cosmos metrics) onto the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+async def measure_event_loop_lag(streams: int = 50, messages: int = 40, offload: bool = True, interval: float = 0.005) -> dict:
+    """
+    Simulate concurrent chat streams persisting every message and measure
+    how late a periodic timer fires on the event loop.
+
+    Args:
+        streams: Number of concurrent streams
+        messages: Messages persisted per stream
+        offload: Use run_blocking (True) or call the store inline (False)
+        interval: Timer period in seconds
+    """
+    import tempfile
+    import crud
+
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    async def stream(index: int):
+        message = {"time": "2025-01-01 00:00:00", "type": "TextMessage", "source": "Coder", "content": "x" * 2000}
+        for _ in range(messages):
+            if offload:
+                await run_blocking(crud.append_messages, "bench", f"stream-{index}", [message], crud.DURABILITY_FLUSH)
+            else:
+                crud.append_messages("bench", f"stream-{index}", [message], crud.DURABILITY_FLUSH)
+            await asyncio.sleep(0)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        crud.DATA_DIR = work_dir
+        tick_task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*(stream(i) for i in range(streams)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await tick_task
+    lags.sort()
+    return {
+        "mode": "offloaded" if offload else "inline",
+        "seconds": elapsed,
+        "p50_ms": lags[len(lags) // 2] * 1000 if lags else 0.0,
+        "p99_ms": lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+        "max_ms": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Measure event-loop lag with inline vs. offloaded persistence.")
+    parser.add_argument("--streams", type=int, default=50, help="Concurrent streams")
+    parser.add_argument("--messages", type=int, default=40, help="Messages persisted per stream")
+
+    # python persistence.py --streams 50
+    args = parser.parse_args()
+    for offload in (False, True):
+        result = asyncio.run(measure_event_loop_lag(args.streams, args.messages, offload=offload))
+        print(f"{result['mode']:>9} | {result['seconds']:6.2f}s | loop lag p50 {result['p50_ms']:7.2f}ms "
+              f"p99 {result['p99_ms']:7.2f}ms max {result['max_ms']:7.2f}ms")
+    shutdown()
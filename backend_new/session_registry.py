@@ -0,0 +1,350 @@
+# File: session_registry.py
+import asyncio
+import inspect
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# A run whose stream produced nothing for this long is treated as abandoned.
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "600"))
+# How often the reaper checks for disconnected or idle sessions.
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "15"))
+# A run with no SSE client attached for this long is stopped (allows page reloads).
+SESSION_DETACHED_TIMEOUT = float(os.getenv("SESSION_DETACHED_TIMEOUT", "120"))
+# Seconds a finished run's events stay available for Last-Event-ID resumes.
+SESSION_RETAIN_FINISHED = float(os.getenv("SESSION_RETAIN_FINISHED", "300"))
+# Events kept per run for clients that attach late or reconnect.
+RUN_BUFFER_SIZE = int(os.getenv("RUN_BUFFER_SIZE", "1000"))
+# Seconds stop() waits for a cancelled run to unwind before closing its resources itself.
+SESSION_STOP_GRACE = float(os.getenv("SESSION_STOP_GRACE", "5"))
+
+_logger = logging.getLogger("session_registry")
+
+
+async def close_resource(resource) -> None:
+    """Close a helper, agent, client or executor via whichever of aclose/close/stop it has."""
+    for name in ("aclose", "close", "stop"):
+        method = getattr(resource, name, None)
+        if callable(method):
+            result = method()
+            if inspect.isawaitable(result):
+                await result
+            return
+
+
+class EventRingBuffer:
+    def __init__(self, maxlen: int = None) -> None:
+        """
+        Bounded, replayable event log for one run.
+
+        Persisted events are numbered 1, 2, ... like the conversation's
+        stored messages (seq 0 is the task), so the SSE id a client resumes
+        from means the same thing here and in the conversation store.
+        Stream-only events (e.g. token deltas) carry no id and preview the
+        next persisted event, so only those after the latest persisted event
+        are kept, apart from the persisted ones; a long answer's deltas never
+        push stored messages out. Readers start after the persisted event
+        they have already seen (the SSE Last-Event-ID) and then wait for new
+        events until the buffer is closed. When more than maxlen persisted
+        events were written the oldest are dropped; read() gets those from
+        its backfill callable (the conversation store) instead.
+
+        Args:
+            maxlen: Number of persisted events kept, and of deltas for the event in progress
+        """
+        # (position, seq, data); position orders persisted events and deltas together
+        self._events = deque(maxlen=maxlen or RUN_BUFFER_SIZE)
+        # (position, data) for the deltas since the latest persisted event
+        self._deltas = deque(maxlen=maxlen or RUN_BUFFER_SIZE)
+        self._next_position = 1
+        self._seq = 0
+        self._closed = False
+        self._changed = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def first_seq(self) -> int:
+        """Seq of the oldest persisted event still kept (the next seq when none are)."""
+        return self._events[0][1] if self._events else self._seq + 1
+
+    def append(self, data: str, persisted: bool = True) -> Optional[int]:
+        """Add an event; returns its id (the message seq), or None for stream-only events."""
+        if persisted:
+            self._seq += 1
+            self._events.append((self._next_position, self._seq, data))
+            # The persisted event supersedes the deltas that previewed it
+            self._deltas.clear()
+        else:
+            self._deltas.append((self._next_position, data))
+        self._next_position += 1
+        self._wake()
+        return self._seq if persisted else None
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        # Wake current readers and give later ones a fresh event to wait on
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def read(self, last_event_id: int = 0, backfill=None):
+        """
+        Yield (id, data) for every event after last_event_id, following the
+        run until it ends; id is None for stream-only events. Persisted
+        events dropped before this reader got to them are fetched with
+        backfill(start_seq, end_seq), an async iterator of (seq, data).
+        """
+        seen, cursor = last_event_id, 0
+        while True:
+            changed = self._changed
+            end_seq = self.first_seq
+            if backfill is not None and seen + 1 < end_seq:
+                async for seq, data in backfill(seen + 1, end_seq):
+                    if seen < seq < end_seq:
+                        yield seq, data
+                        seen = seq
+                # Whatever the store doesn't have is gone; don't ask again
+                seen = max(seen, end_seq - 1)
+                continue
+            pending = [(position, seq, data) for position, seq, data in self._events if seq > seen]
+            if self._seq >= seen:
+                # Deltas after the latest persisted event, which this reader has now reached
+                pending += [(position, None, data) for position, data in self._deltas if position > cursor]
+            for position, seq, data in pending:
+                yield seq, data
+                cursor = position
+                if seq is not None:
+                    seen = seq
+            if pending:
+                continue
+            if self._closed:
+                return
+            await changed.wait()
+
+
+@dataclass
+class RunningSession:
+    session_id: str
+    user_id: str
+    started_at: float = field(default_factory=time.time)
+    last_activity: float = field(default_factory=time.time)
+    cancellation_token: Any = None
+    task: Optional[asyncio.Task] = None
+    resources: List[Any] = field(default_factory=list)
+    buffer: EventRingBuffer = field(default_factory=EventRingBuffer)
+    subscribers: int = 0
+    detached_since: Optional[float] = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    events: int = 0
+    stop_reason: Optional[str] = None
+    # Waiting for an admission slot; not idle, just not started yet
+    queued: bool = False
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    _closed: bool = False
+
+    def to_json(self) -> dict:
+        now = time.time()
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "running_seconds": round(now - self.started_at, 1),
+            "idle_seconds": round(now - self.last_activity, 1),
+            "events": self.events,
+            "subscribers": self.subscribers,
+            "queued": self.queued,
+            "finished": self.finished_at is not None,
+            "stop_reason": self.stop_reason,
+        }
+
+
+class SessionRegistry:
+    def __init__(self, idle_timeout: Optional[float] = None, reap_interval: Optional[float] = None) -> None:
+        """
+        Tracks every running team so it can be cancelled and cleaned up.
+
+        Each run registers its cancellation token, the background task
+        executing it and the resources it owns (model clients, code
+        executors, browsers). The run writes its events into a ring buffer
+        that SSE clients subscribe to, detach from and resume. stop()
+        cancels the run and closes those resources; a background reaper
+        stops runs with no client attached for SESSION_DETACHED_TIMEOUT or
+        no events for idle_timeout seconds, and forgets finished runs after
+        SESSION_RETAIN_FINISHED.
+
+        Args:
+            idle_timeout: Seconds without events before a run is reaped
+            reap_interval: Seconds between reaper passes
+        """
+        self.idle_timeout = idle_timeout or SESSION_IDLE_TIMEOUT
+        self.reap_interval = reap_interval or SESSION_REAP_INTERVAL
+        self._sessions: Dict[str, RunningSession] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def start(self) -> "SessionRegistry":
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+        return self
+
+    async def close(self) -> None:
+        """Stop the reaper and every run still registered (server shutdown)."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        await asyncio.gather(*(self.stop(session_id, "server shutdown") for session_id in list(self._sessions)))
+
+    def claim(self, session_id: str, user_id: str) -> Tuple[RunningSession, bool]:
+        """
+        (run, created): the run registered for session_id, or a new one.
+
+        Synchronous, so callers that claim before their first await can't
+        race: a concurrent request for the same session gets the existing
+        run (created False) and attaches to it instead of starting another.
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            return session, False
+        session = self._sessions[session_id] = RunningSession(session_id=session_id, user_id=user_id)
+        return session, True
+
+    def discard(self, session: RunningSession) -> None:
+        """Forget a claimed run that never started; clients already attached see the stream end."""
+        session.buffer.close()
+        session.finished_at = session.finished_at or time.time()
+        session.done.set()
+        if self._sessions.get(session.session_id) is session:
+            del self._sessions[session.session_id]
+
+    def get(self, session_id: str) -> Optional[RunningSession]:
+        return self._sessions.get(session_id)
+
+    def _resolve(self, session: Union[str, RunningSession]) -> Optional[RunningSession]:
+        # Runs pass their own RunningSession so they never act on a later run with the same id
+        return self._sessions.get(session) if isinstance(session, str) else session
+
+    def list(self, user_id: Optional[str] = None) -> List[dict]:
+        return [s.to_json() for s in self._sessions.values() if user_id is None or s.user_id == user_id]
+
+    def attach_task(self, session: Union[str, RunningSession], task: Optional[asyncio.Task] = None) -> None:
+        """Record the task executing the run (the current task by default)."""
+        session = self._resolve(session)
+        if session is not None:
+            session.task = task or asyncio.current_task()
+
+    def publish(self, session: Union[str, RunningSession], data: str, persisted: bool = True) -> Optional[int]:
+        """Append an event to the run's buffer; persisted is False for events not written to the conversation."""
+        session = self._resolve(session)
+        if session is None:
+            return None
+        session.last_activity = time.time()
+        session.events += 1
+        return session.buffer.append(data, persisted)
+
+    async def subscribe(self, session_id: str, last_event_id: int = 0, queue_status=None, backfill=None):
+        """
+        Yield (event, id, data) for a run's events after last_event_id until
+        the run ends; event is None and id is None for stream-only events.
+        While the run waits for admission, the statuses from the
+        queue_status async iterator are passed through first as
+        ("queue", None, status). backfill(start_seq, end_seq) supplies
+        persisted events the run's buffer no longer holds.
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        session.subscribers += 1
+        session.detached_since = None
+        try:
+            if queue_status is not None:
+                async for status in queue_status:
+                    yield "queue", None, status
+            async for event_id, data in session.buffer.read(last_event_id, backfill):
+                yield None, event_id, data
+        finally:
+            session.subscribers -= 1
+            if session.subscribers == 0:
+                session.detached_since = time.time()
+
+    def is_running(self, session_id: str) -> bool:
+        session = self._sessions.get(session_id)
+        return session is not None and session.finished_at is None
+
+    def was_stopped(self, session: Union[str, RunningSession]) -> bool:
+        session = self._resolve(session)
+        return session is not None and session.stop_reason is not None
+
+    async def finish(self, session: Union[str, RunningSession]) -> None:
+        """
+        Release a run's resources and close its buffer; called when the run
+        ends. The buffer stays readable for SESSION_RETAIN_FINISHED. Idempotent.
+        """
+        session = self._resolve(session)
+        if session is None:
+            return
+        await self._close_session(session)
+        session.buffer.close()
+        if session.finished_at is None:
+            session.finished_at = time.time()
+
+    async def stop(self, session: Union[str, RunningSession], reason: str = "stopped") -> bool:
+        """Cancel a running session. Returns False if it isn't running."""
+        session = self._resolve(session)
+        if session is None or session.finished_at is not None:
+            return False
+        session_id = session.session_id
+        if session.stop_reason is None:
+            session.stop_reason = reason
+            _logger.warning(f"Stopping session {session_id} ({reason})")
+            if session.cancellation_token is not None:
+                session.cancellation_token.cancel()
+            elif session.task is not None and session.task is not asyncio.current_task():
+                session.task.cancel()
+        try:
+            # Let the stream's own cleanup run first
+            await asyncio.wait_for(asyncio.shield(session.done.wait()), timeout=SESSION_STOP_GRACE)
+        except asyncio.TimeoutError:
+            _logger.warning(f"Session {session_id} did not stop within {SESSION_STOP_GRACE}s; closing its resources")
+        await self.finish(session)
+        return True
+
+    async def _close_session(self, session: RunningSession) -> None:
+        if session._closed:
+            return
+        session._closed = True
+        for resource in session.resources:
+            try:
+                await close_resource(resource)
+            except Exception as e:
+                _logger.error(f"Error closing {type(resource).__name__} for session {session.session_id}: {str(e)}")
+        session.done.set()
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            now = time.time()
+            for session in list(self._sessions.values()):
+                if session.finished_at is not None:
+                    if now - session.finished_at > SESSION_RETAIN_FINISHED and self._sessions.get(session.session_id) is session:
+                        del self._sessions[session.session_id]
+                    continue
+                if session.stop_reason is not None:
+                    continue
+                try:
+                    if session.subscribers == 0 and session.detached_since is not None \
+                            and now - session.detached_since > SESSION_DETACHED_TIMEOUT:
+                        asyncio.create_task(self.stop(session, "no client attached"))
+                    elif not session.queued and now - session.last_activity > self.idle_timeout:
+                        asyncio.create_task(self.stop(session, f"idle for {self.idle_timeout:.0f}s"))
+                except Exception as e:
+                    _logger.error(f"Error checking session {session.session_id}: {str(e)}")
@@ -0,0 +1,152 @@
+# File: team_catalog.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Seconds between change-feed checks; requests in between are served from memory.
+TEAM_CATALOG_TTL = float(os.getenv("TEAM_CATALOG_TTL", "30"))
+# Seconds between full reloads. The change feed does not report deletes made
+# by other instances, so the catalog is rebuilt from scratch this often.
+TEAM_CATALOG_MAX_AGE = float(os.getenv("TEAM_CATALOG_MAX_AGE", "600"))
+
+SUMMARY_FIELDS = ("id", "team_id", "name", "logo", "description")
+
+
+def compute_etag(value) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header already names etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def team_summary(team: dict) -> dict:
+    return {field: team.get(field) for field in SUMMARY_FIELDS}
+
+
+class TeamCatalog:
+    def __init__(self, db, ttl: Optional[float] = None, max_age: Optional[float] = None) -> None:
+        """
+        In-memory copy of the agent_teams container.
+
+        The catalog is loaded once and then refreshed from the Cosmos change
+        feed at most every ttl seconds, so /teams no longer runs a full
+        SELECT * on every request. Writes made through this process call
+        invalidate() so they are visible immediately.
+
+        Args:
+            db: The application's CosmosDB instance
+            ttl: Seconds between change-feed checks
+            max_age: Seconds between full reloads
+        """
+        self.db = db
+        self.ttl = TEAM_CATALOG_TTL if ttl is None else ttl
+        self.max_age = TEAM_CATALOG_MAX_AGE if max_age is None else max_age
+
+        self._lock = threading.Lock()
+        self._teams: Dict[str, dict] = {}
+        self._etags: Dict[str, str] = {}
+        self._continuation: Optional[str] = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._version: Optional[Dict[str, str]] = None
+        self._logger = logging.getLogger("team_catalog")
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _container(self):
+        return self.db.get_container("agent_teams")
+
+    def _read_feed(self, container, **kwargs) -> tuple:
+        """(changed teams, continuation token) for one change-feed read."""
+        # The pager's token is the SDK's own continuation; the raw etag header isn't
+        # resumable with the newer change-feed format
+        pages = container.query_items_change_feed(**kwargs).by_page()
+        changed = [team for page in pages for team in page]
+        return changed, pages.continuation_token
+
+    def _reload(self) -> None:
+        container = self._container()
+        teams = self.db.get_teams()
+        # Start the change feed at "now" so the next refresh only sees later writes
+        _, self._continuation = self._read_feed(container, is_start_from_beginning=False)
+        self._teams = {team["team_id"]: team for team in teams if "team_id" in team}
+        self._loaded_at = self._checked_at = time.time()
+        self._rebuild_etags()
+        self._logger.info(f"Loaded {len(self._teams)} teams")
+
+    def _apply_changes(self) -> None:
+        if self._continuation is None:
+            # Without a continuation the feed would start at "now" and skip changes
+            self._reload()
+            return
+        container = self._container()
+        changed, continuation = self._read_feed(container, continuation=self._continuation)
+        if continuation is None:
+            self._logger.warning("Change feed returned no continuation, reloading teams")
+            self._reload()
+            return
+        self._continuation = continuation
+        self._checked_at = time.time()
+        if changed:
+            for team in changed:
+                if "team_id" in team:
+                    self._teams[team["team_id"]] = team
+            self._rebuild_etags()
+            self._logger.info(f"Applied {len(changed)} team changes from the change feed")
+
+    def _rebuild_etags(self) -> None:
+        # Per-team ETags are the Cosmos _etag, so clients can send them back as If-Match
+        self._etags = {team_id: team.get("_etag") or compute_etag(team) for team_id, team in self._teams.items()}
+        self._version = {
+            "full": compute_etag(sorted(self._etags.items())),
+            "summary": compute_etag([team_summary(t) for t in self._sorted()]),
+        }
+
+    def _sorted(self) -> List[dict]:
+        return sorted(self._teams.values(), key=lambda team: str(team.get("id")))
+
+    def refresh(self) -> None:
+        """Bring the catalog up to date if it is older than ttl."""
+        with self._lock:
+            now = time.time()
+            if not self._loaded_at or now - self._loaded_at >= self.max_age:
+                self._reload()
+            elif now - self._checked_at >= self.ttl:
+                try:
+                    self._apply_changes()
+                except Exception as e:
+                    self._logger.warning(f"Change feed check failed, reloading teams: {str(e)}")
+                    self._reload()
+
+    def list_teams(self) -> tuple:
+        """(teams, etag) for the full team definitions."""
+        self.refresh()
+        with self._lock:
+            return self._sorted(), self._version["full"]
+
+    def list_summaries(self) -> tuple:
+        """(summaries, etag) with only id, team_id, name, logo and description."""
+        self.refresh()
+        with self._lock:
+            return [team_summary(team) for team in self._sorted()], self._version["summary"]
+
+    def get_team(self, team_id: str) -> tuple:
+        """(team, etag) or (None, None) when the team does not exist."""
+        self.refresh()
+        with self._lock:
+            team = self._teams.get(team_id)
+            return (team, self._etags.get(team_id)) if team is not None else (None, None)
@@ -239,12 +239,29 @@ export const TeamsProvider: React.FC<{ children: React.ReactNode }> = ({ childre
       }
       try {
         const response = await axios.post(`${BASE_URL}/upload`, formData);
-        if (response.data.status === "error") {
-          console.error('Upload API Error:', response.data.message);
+        console.log('Upload response:', response.data);
+        // Indexing runs as a background job; follow its progress until it finishes
+        const job = await new Promise<any>((resolve) => {
+          let last: any = null;
+          const events = new EventSource(`${BASE_URL}${response.data.events_url}`);
+          events.onmessage = (event) => {
+            last = JSON.parse(event.data);
+            console.log('Upload job progress:', last.status, last.phases);
+          };
+          events.addEventListener('end', () => {
+            events.close();
+            resolve(last);
+          });
+          events.onerror = () => {
+            events.close();
+            resolve(last);
+          };
+        });
+        if (job?.status === "failed") {
+          console.error('Upload job failed:', job.error);
 //TODO handle error -> propagate to UI
           return;
         }
-        console.log('Upload response:', response.data);
       } catch (error) {
         console.error('Upload error:', error);
       } finally {
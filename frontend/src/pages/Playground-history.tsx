@@ -64,6 +64,9 @@ export default function PlaygroundHistory() {
   const [totalPages, setTotalPages] = useState(1);
   const [totalCount, setTotalCount] = useState(0);
   const [pageSize, setPageSize] = useState(20);
+  // Continuation token that fetches each page; page 1 needs none
+  const [pageTokens, setPageTokens] = useState<Record<number, string | null>>({ 1: null });
+  const [usesCursor, setUsesCursor] = useState(false);
 
   // New state for dialog display.
   const [dialogOpen, setDialogOpen] = useState(false);
@@ -96,14 +99,25 @@ export default function PlaygroundHistory() {
   
 
 
-    async function fetchHistory(userId: string, page = 1, itemsPerPage = 20) {
+    async function fetchHistory(userId: string, page = 1, itemsPerPage = 20, continuationToken: string | null = null) {
       try {
         setIsHistoryLoading(true);
         console.log('Fetching for:', userId, 'page:', page, 'pageSize:', itemsPerPage);
         const response = await axios.post(`${BASE_URL}/conversations`, { 
           user_id: userId,
           page: page,
-          page_size: itemsPerPage
+          page_size: itemsPerPage,
+          continuation_token: continuationToken
+        });
+        const cursorMode = response.data.continuation_token !== undefined;
+        setUsesCursor(cursorMode);
+        setPageTokens((tokens) => {
+          const next = page === 1 ? { 1: null } : { ...tokens };
+          next[page] = continuationToken;
+          if (cursorMode) {
+            next[page + 1] = response.data.continuation_token;
+          }
+          return next;
         });
         console.log('Response:', response.data);
         setHistoryItems(response.data.conversations);
@@ -279,7 +293,7 @@ export default function PlaygroundHistory() {
                       <Button
                         variant="outline"
                         size="sm"
-                        onClick={() => fetchHistory(userInfo.email, currentPage - 1, pageSize)}
+                        onClick={() => fetchHistory(userInfo.email, currentPage - 1, pageSize, pageTokens[currentPage - 1] ?? null)}
                         disabled={currentPage === 1}
                       >
                         Previous
@@ -290,8 +304,8 @@ export default function PlaygroundHistory() {
                       <Button
                         variant="outline"
                         size="sm"
-                        onClick={() => fetchHistory(userInfo.email, currentPage + 1, pageSize)}
-                        disabled={currentPage === totalPages}
+                        onClick={() => fetchHistory(userInfo.email, currentPage + 1, pageSize, pageTokens[currentPage + 1] ?? null)}
+                        disabled={usesCursor ? !pageTokens[currentPage + 1] : currentPage === totalPages}
                       >
                         Next
                       </Button>
@@ -299,7 +313,7 @@ export default function PlaygroundHistory() {
                         variant="outline"
                         size="sm"
                         onClick={() => fetchHistory(userInfo.email, totalPages, pageSize)}
-                        disabled={currentPage === totalPages}
+                        disabled={usesCursor || currentPage === totalPages}
                       >
                         Last
                       </Button>
@@ -376,7 +390,7 @@ export default function PlaygroundHistory() {
                                   <p className="text-sm font-semibold">{message.source}</p>
                                   <MarkdownRenderer markdownText={message.content} />
                                   {message.content_image && (
-                                    <img src={`${message.content_image}`} alt="content" className="mt-2 max-w-[625px]" />
+                                    <img src={message.content_image.startsWith("/artifacts/") ? `${BASE_URL}${message.content_image}` : message.content_image} alt="content" className="mt-2 max-w-[625px]" />
                                   )}
                                 </div>
                               </div>
@@ -107,6 +107,8 @@ export default function App() {
   // const [isFileCardVisible, setIsFileCardVisible] = useState(false)
   // const [isSettingsCardVisible, setIsSettingsCardVisible] = useState(false)
   const [isTyping, setIsTyping] = useState(false);
+  // Place in the backend's wait queue; 0 once the team is running
+  const [queuePosition, setQueuePosition] = useState(0);
   const { userInfo } = useUserContext();
   // const { teams } = useTeamsContext();
   const { teams, loading, reloadTeams } = useTeamsContext();
@@ -177,8 +179,12 @@ export default function App() {
       const sessionId = response.data.response;  // Get the session ID from the response
       setSessionID(sessionId);
       const eventSource = new EventSource(`${BASE_URL}/chat-stream?session_id=${encodeURIComponent(sessionId)}&user_id=${encodeURIComponent(userInfo.email)}`);
+      eventSource.addEventListener('queue', (event) => {
+        setQueuePosition(JSON.parse((event as MessageEvent).data).position);
+      });
       eventSource.onmessage = (event) => {
         // console.log('EventSource message:', event.data);
+        setQueuePosition(0);
         const data = JSON.parse(event.data);
         if (data.stop_reason) {
           setIsTyping(false);
@@ -207,7 +213,19 @@ export default function App() {
         setChatHistory((prev) => [...prev, aiMessage]);
       };
   
+      // The backend sends "end" once the run is over; until then a dropped connection
+      // is retried by EventSource, which resumes from the Last-Event-ID
+      eventSource.addEventListener('end', () => {
+        setIsTyping(false);
+        setQueuePosition(0);
+        eventSource.close();
+      });
+  
       eventSource.onerror = (error) => {
+        if (eventSource.readyState === EventSource.CONNECTING) {
+          console.warn('EventSource reconnecting:', error);
+          return;
+        }
         setIsTyping(false);
         console.error('EventSource error:', error);
         eventSource.close();
@@ -403,7 +421,9 @@ export default function App() {
                 ) : null}
                 {isTyping ? (
                   <div className="flex items-center gap-2 text-sm text-muted-foreground">
-                    <p className='text-sm text-muted-foreground'>Running {sessionID} session...</p>
+                    <p className='text-sm text-muted-foreground'>
+                      {queuePosition > 0 ? `Waiting for a free slot (position ${queuePosition})...` : `Running ${sessionID} session...`}
+                    </p>
                     <Loader2 className="lucide lucide-loader2 mr-2 h-4 animate-spin loader-green" />
                     {/* button to stop the session */}
                     <Button variant="destructive" onClick={() => stopSession()}>Stop</Button>
@@ -469,7 +489,7 @@ export default function App() {
                               <MarkdownRenderer markdownText={message.message} />
                               {/* Display image if available */}
                               {message.content_image && (
-                                <img src={`${message.content_image}`} alt="content" className="mt-2 max-w-[625px]" />
+                                <img src={message.content_image.startsWith("/artifacts/") ? `${BASE_URL}${message.content_image}` : message.content_image} alt="content" className="mt-2 max-w-[625px]" />
                               )}
                               {/* <MarkdownRenderer>{message.message}</MarkdownRenderer> */}
                               <p className="text-xs text-muted-foreground">{message.time && new Date(message.time).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', second: '2-digit',hour12: false })}</p>
@@ -153,17 +153,32 @@ class StreamlitAgentChat:
             params = {"session_id": session_id, "user_id": self.user_id}
             
             with requests.get(url, params=params, stream=True) as response:
+                if response.status_code == 429:
+                    # Admission control: too many sessions running or waiting
+                    st.warning(f"The server is busy, please retry in {response.headers.get('Retry-After', '60')}s.")
+                    yield None
+                    return
                 response.raise_for_status()
                 
+                event = None
+                queue_notice = st.empty()
                 for line in response.iter_lines():
-                    if line:
-                        line = line.decode('utf-8')
-                        if line.startswith('data: '):
-                            try:
-                                data = json.loads(line[6:])  # Remove 'data: ' prefix
-                                yield data
-                            except json.JSONDecodeError:
-                                continue
+                    if not line:
+                        event = None  # a blank line ends an SSE event
+                        continue
+                    line = line.decode('utf-8')
+                    if line.startswith('event: '):
+                        event = line[7:]
+                    elif line.startswith('data: '):
+                        try:
+                            data = json.loads(line[6:])  # Remove 'data: ' prefix
+                        except json.JSONDecodeError:
+                            continue
+                        if event == 'queue':
+                            queue_notice.info(f"Waiting for a free slot (position {data.get('position')})...")
+                            continue
+                        queue_notice.empty()
+                        yield data
                                 
         except requests.exceptions.RequestException as e:
             st.error(f"Error streaming responses: {str(e)}")
@@ -172,9 +187,17 @@ class StreamlitAgentChat:
     def get_teams(self) -> List[Dict]:
         """Get available teams"""
         try:
-            response = requests.get(f"{BACKEND_URL}/teams")
+            # Revalidate the copy from the previous rerun; 304 means it is still current
+            cached = st.session_state.get("teams_cache")
+            headers = {"If-None-Match": cached["etag"]} if cached else {}
+            response = requests.get(f"{BACKEND_URL}/teams", headers=headers)
+            if response.status_code == 304 and cached:
+                return cached["teams"]
             response.raise_for_status()
-            return response.json()
+            teams = response.json()
+            if response.headers.get("ETag"):
+                st.session_state.teams_cache = {"etag": response.headers["ETag"], "teams": teams}
+            return teams
         except requests.exceptions.RequestException as e:
             st.error(f"Error fetching teams: {str(e)}")
             return []
@@ -363,6 +363,19 @@ backend_container_app = azure_native.app.ContainerApp(
                     azure_native.app.EnvironmentVarArgs(
                         name="AZURE_SEARCH_SERVICE_ENDPOINT",
                         value=pulumi.Output.concat("https://", ai_search.name, ".search.windows.net/")
+                    ),
+                    # Concurrent teams per replica, sized for the 2Gi container below
+                    azure_native.app.EnvironmentVarArgs(
+                        name="ADMISSION_MAX_SESSIONS",
+                        value="3"
+                    ),
+                    azure_native.app.EnvironmentVarArgs(
+                        name="ADMISSION_MAX_PER_USER",
+                        value="2"
+                    ),
+                    azure_native.app.EnvironmentVarArgs(
+                        name="ADMISSION_MAX_QUEUE",
+                        value="20"
                     )
                 ],
                 resources=azure_native.app.ContainerResourcesArgs(